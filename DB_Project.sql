@@ -1,4 +1,9 @@
 -- Drop existing tables if they exist
+DROP TABLE IF EXISTS schema_version;
+DROP TABLE IF EXISTS Copy_Availability;
+DROP TABLE IF EXISTS Delete_Runs;
+DROP TABLE IF EXISTS Jobs;
+DROP TABLE IF EXISTS Table_Versions;
 DROP TABLE IF EXISTS Loans;
 DROP TABLE IF EXISTS Book_Copies;
 DROP TABLE IF EXISTS Book_Authors;
@@ -1,941 +1,4237 @@
-from flask import Flask, render_template, jsonify, request
-import mysql.connector
-from datetime import datetime
-import datetime as _datetime
-from collections import defaultdict
-import csv
-import os
-import random
-import uuid
-
-DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def dump_table_to_csv(table_name, csv_filename):
-    """Dump entire table to CSV file path under DATA_DIR."""
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        cols = [d[0] for d in cursor.description]
-        csv_path = os.path.join(DATA_DIR, csv_filename)
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(cols)
-            for r in rows:
-                writer.writerow(r)
-        cursor.close()
-        conn.close()
-    except Exception:
-        # don't interrupt main flow if CSV dump fails
-        pass
-
-app = Flask(__name__)
-
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'library'
-}
-
-def get_connection():
-    return mysql.connector.connect(**db_config)
-
-@app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-    return response
-
-# ==================== HOME ====================
-@app.route('/')
-def home():
-    return render_template('library_management_frontend.html')
-
-# ==================== BOOKS ====================
-@app.route('/api/books', methods=['GET'])
-def get_books():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Books")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/books', methods=['POST'])
-def add_book():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Books (title, isbn, genre, publisher_id, publication_year) VALUES (%s, %s, %s, %s, %s)",
-            (data['title'], data.get('isbn', None), data['genre'], data['publisher_id'], data['publication_year'])
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Book added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Update a book
-@app.route('/api/books/<int:isbn>', methods=['PUT'])
-def update_book(isbn):
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Books SET title=%s, publisher_id=%s, publication_year=%s, genre=%s WHERE isbn=%s",
-            (data.get('title'), data.get('publisher_id'), data.get('publication_year'), data.get('genre'), isbn)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Book updated', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Delete a book
-@app.route('/api/books/<int:isbn>', methods=['DELETE'])
-def delete_book(isbn):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Books WHERE isbn=%s", (isbn,))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Book deleted', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== MEMBERS ====================
-@app.route('/api/members', methods=['GET'])
-def get_members():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Members")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        # Convert date objects to strings
-        for member in data:
-            if 'date_registered' in member and member['date_registered']:
-                member['date_registered'] = str(member['date_registered'])
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/members', methods=['POST'])
-def add_member():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Members (first_name, last_name, email, address, phone, date_registered) VALUES (%s, %s, %s, %s, %s, CURDATE())",
-            (data['first_name'], data['last_name'], data['email'], data['address'], data['phone'])
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Member added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Update member
-@app.route('/api/members/<int:member_id>', methods=['PUT'])
-def update_member(member_id):
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Members SET first_name=%s, last_name=%s, email=%s, address=%s, phone=%s WHERE member_id=%s",
-            (data.get('first_name'), data.get('last_name'), data.get('email'), data.get('address'), data.get('phone'), member_id)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Member updated', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Delete member
-@app.route('/api/members/<int:member_id>', methods=['DELETE'])
-def delete_member(member_id):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Members WHERE member_id=%s", (member_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Member deleted', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== LOANS ====================
-@app.route('/api/loans', methods=['GET'])
-def get_loans():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Loans")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        # Convert date objects to strings
-        for loan in data:
-            for date_field in ['issue_date', 'due_date', 'return_date']:
-                if date_field in loan and loan[date_field]:
-                    loan[date_field] = str(loan[date_field])
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/loans', methods=['POST'])
-def add_loan():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        # Insert loan (include fine_amount if provided). Sanitize fine_amount from frontend.
-        fine_amount = data.get('fine_amount')
-        if fine_amount is None or fine_amount == '':
-            fine_amount = None
-        else:
-            # try to convert to float for DB insertion; if fails, treat as None
-            try:
-                fine_amount = float(fine_amount)
-            except Exception:
-                fine_amount = None
-
-        if fine_amount is not None:
-            cursor.execute(
-                "INSERT INTO Loans (copy_id, member_id, issue_date, due_date, fine_amount) VALUES (%s, %s, %s, %s, %s)",
-                (data['copy_id'], data['member_id'], data['issue_date'], data['due_date'], fine_amount)
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO Loans (copy_id, member_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
-                (data['copy_id'], data['member_id'], data['issue_date'], data['due_date'])
-            )
-        # Mark copy as On Loan
-        cursor.execute(
-            "UPDATE Book_Copies SET status = %s WHERE copy_id = %s",
-            ('On Loan', data['copy_id'])
-        )
-        conn.commit()
-        # Dump CSVs for Loans and Book_Copies to keep CSV entities updated
-        try:
-            dump_table_to_csv('Loans', 'loans.csv')
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Loan created successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Update loan
-@app.route('/api/loans/<int:loan_id>', methods=['PUT'])
-def update_loan(loan_id):
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Loans SET copy_id=%s, member_id=%s, issue_date=%s, due_date=%s, return_date=%s, fine_amount=%s WHERE loan_id=%s",
-            (data.get('copy_id'), data.get('member_id'), data.get('issue_date'), data.get('due_date'), data.get('return_date'), data.get('fine_amount'), loan_id)
-        )
-        # If return_date is provided, update copy status back to Available
-        if data.get('return_date'):
-            cursor.execute("UPDATE Book_Copies SET status=%s WHERE copy_id=%s", ('Available', data.get('copy_id')))
-        conn.commit()
-        # update CSVs
-        try:
-            dump_table_to_csv('Loans', 'loans.csv')
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Loan updated', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Delete loan
-@app.route('/api/loans/<int:loan_id>', methods=['DELETE'])
-def delete_loan(loan_id):
-    try:
-        # find loan to get copy_id
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT copy_id FROM Loans WHERE loan_id=%s", (loan_id,))
-        row = cursor.fetchone()
-        copy_id = row.get('copy_id') if row else None
-        cursor.close()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Loans WHERE loan_id=%s", (loan_id,))
-        # set copy to Available if it existed
-        if copy_id:
-            cursor.execute("UPDATE Book_Copies SET status=%s WHERE copy_id=%s", ('Available', copy_id))
-        conn.commit()
-        try:
-            dump_table_to_csv('Loans', 'loans.csv')
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Loan deleted', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== BOOK COPIES ====================
-@app.route('/api/copies', methods=['GET'])
-def get_copies():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Book_Copies")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/copies', methods=['POST'])
-def add_copy():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Book_Copies (isbn, branch_id, status) VALUES (%s, %s, %s)",
-            (data.get('isbn'), data.get('branch_id'), data.get('status', 'Available'))
-        )
-        conn.commit()
-        try:
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Copy added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Edit a copy
-@app.route('/api/copies/<int:copy_id>', methods=['PUT'])
-def update_copy(copy_id):
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Book_Copies SET isbn=%s, branch_id=%s, status=%s WHERE copy_id=%s",
-            (data.get('isbn'), data.get('branch_id'), data.get('status'), copy_id)
-        )
-        conn.commit()
-        try:
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Copy updated', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# Delete a copy
-@app.route('/api/copies/<int:copy_id>', methods=['DELETE'])
-def delete_copy(copy_id):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM Book_Copies WHERE copy_id=%s", (copy_id,))
-        conn.commit()
-        try:
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Copy deleted', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== BRANCHES ====================
-@app.route('/api/branches', methods=['GET'])
-def get_branches():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Library_Branches")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/branches', methods=['POST'])
-def add_branch():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Library_Branches (name, location) VALUES (%s, %s)",
-            (data['branch_name'], data['location'])
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Branch added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== PUBLISHERS ====================
-@app.route('/api/publishers', methods=['GET'])
-def get_publishers():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Publishers")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/publishers', methods=['POST'])
-def add_publisher():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Publishers (name, address, phone) VALUES (%s, %s, %s)",
-            (data['publisher_name'], data['address'], data['phone'])
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Publisher added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# ==================== BULK DELETE ENDPOINTS ====================
-@app.route('/api/books/bulk_delete', methods=['POST'])
-def bulk_delete_books():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # delete dependent rows: Loans -> Book_Copies -> Book_Authors -> Books
-        # 1) Find copies for these books
-        cursor.execute(f"SELECT copy_id FROM Book_Copies WHERE isbn IN ({placeholders})", tuple(ids))
-        copy_rows = cursor.fetchall()
-        copy_ids = [r[0] for r in copy_rows if r]
-        if copy_ids:
-            ph_c = ','.join(['%s'] * len(copy_ids))
-            cursor.execute(f"DELETE FROM Loans WHERE copy_id IN ({ph_c})", tuple(copy_ids))
-            cursor.execute(f"DELETE FROM Book_Copies WHERE copy_id IN ({ph_c})", tuple(copy_ids))
-        # delete book_authors
-        cursor.execute(f"DELETE FROM Book_Authors WHERE isbn IN ({placeholders})", tuple(ids))
-        # finally delete books
-        cursor.execute(f"DELETE FROM Books WHERE isbn IN ({placeholders})", tuple(ids))
-        conn.commit()
-        try:
-            dump_table_to_csv('Books', 'books.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/members/bulk_delete', methods=['POST'])
-def bulk_delete_members():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # delete dependent loans first
-        cursor.execute(f"DELETE FROM Loans WHERE member_id IN ({placeholders})", tuple(ids))
-        cursor.execute(f"DELETE FROM Members WHERE member_id IN ({placeholders})", tuple(ids))
-        conn.commit()
-        try:
-            dump_table_to_csv('Members', 'members.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/loans/bulk_delete', methods=['POST'])
-def bulk_delete_loans():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        # collect copy_ids for loans to set copies available
-        placeholders = ','.join(['%s'] * len(ids))
-        cursor.execute(f"SELECT copy_id FROM Loans WHERE loan_id IN ({placeholders})", tuple(ids))
-        rows = cursor.fetchall()
-        copy_ids = [r[0] for r in rows if r]
-        # delete loans
-        cursor.execute(f"DELETE FROM Loans WHERE loan_id IN ({placeholders})", tuple(ids))
-        if copy_ids:
-            ph = ','.join(['%s'] * len(copy_ids))
-            # set copies to Available
-            cursor.execute(f"UPDATE Book_Copies SET status=%s WHERE copy_id IN ({ph})", tuple(['Available'] + copy_ids))
-        conn.commit()
-        try:
-            dump_table_to_csv('Loans', 'loans.csv')
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/copies/bulk_delete', methods=['POST'])
-def bulk_delete_copies():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # delete loans referencing these copies first
-        cursor.execute(f"DELETE FROM Loans WHERE copy_id IN ({placeholders})", tuple(ids))
-        cursor.execute(f"DELETE FROM Book_Copies WHERE copy_id IN ({placeholders})", tuple(ids))
-        conn.commit()
-        try:
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-        except Exception:
-            pass
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/branches/bulk_delete', methods=['POST'])
-def bulk_delete_branches():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # find copies in these branches and delete loans, then copies
-        cursor.execute(f"SELECT copy_id FROM Book_Copies WHERE branch_id IN ({placeholders})", tuple(ids))
-        rows = cursor.fetchall()
-        copy_ids = [r[0] for r in rows if r]
-        if copy_ids:
-            ph = ','.join(['%s'] * len(copy_ids))
-            cursor.execute(f"DELETE FROM Loans WHERE copy_id IN ({ph})", tuple(copy_ids))
-            cursor.execute(f"DELETE FROM Book_Copies WHERE copy_id IN ({ph})", tuple(copy_ids))
-        cursor.execute(f"DELETE FROM Library_Branches WHERE branch_id IN ({placeholders})", tuple(ids))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/publishers/bulk_delete', methods=['POST'])
-def bulk_delete_publishers():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # find books for these publishers and cascade delete similar to books endpoint
-        cursor.execute(f"SELECT isbn FROM Books WHERE publisher_id IN ({placeholders})", tuple(ids))
-        rows = cursor.fetchall()
-        isbns = [r[0] for r in rows if r]
-        if isbns:
-            ph_b = ','.join(['%s'] * len(isbns))
-            # delete loans for copies of these books
-            cursor.execute(f"SELECT copy_id FROM Book_Copies WHERE isbn IN ({ph_b})", tuple(isbns))
-            copy_rows = cursor.fetchall()
-            copy_ids = [r[0] for r in copy_rows if r]
-            if copy_ids:
-                ph_c = ','.join(['%s'] * len(copy_ids))
-                cursor.execute(f"DELETE FROM Loans WHERE copy_id IN ({ph_c})", tuple(copy_ids))
-                cursor.execute(f"DELETE FROM Book_Copies WHERE copy_id IN ({ph_c})", tuple(copy_ids))
-            cursor.execute(f"DELETE FROM Book_Authors WHERE isbn IN ({ph_b})", tuple(isbns))
-            cursor.execute(f"DELETE FROM Books WHERE isbn IN ({ph_b})", tuple(isbns))
-        # finally delete publishers
-        cursor.execute(f"DELETE FROM Publishers WHERE publisher_id IN ({placeholders})", tuple(ids))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/authors/bulk_delete', methods=['POST'])
-def bulk_delete_authors():
-    try:
-        data = request.json or {}
-        ids = data.get('ids') or []
-        if not ids:
-            return jsonify({'error': 'No ids provided'}), 400
-        conn = get_connection()
-        cursor = conn.cursor()
-        placeholders = ','.join(['%s'] * len(ids))
-        # delete book_author links first
-        cursor.execute(f"DELETE FROM Book_Authors WHERE author_id IN ({placeholders})", tuple(ids))
-        cursor.execute(f"DELETE FROM Authors WHERE author_id IN ({placeholders})", tuple(ids))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'deleted': len(ids)})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# ==================== AUTHORS ====================
-@app.route('/api/authors', methods=['GET'])
-def get_authors():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM Authors")
-        data = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/authors', methods=['POST'])
-def add_author():
-    try:
-        data = request.json
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO Authors (first_name, last_name) VALUES (%s, %s)",
-            (data['first_name'], data['last_name'])
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Author added successfully', 'status': 'success'})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-# ==================== SEED / SAMPLE DATA ====================
-@app.route('/api/seed', methods=['POST'])
-def seed_data():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        inserted = {'publishers': 0, 'authors': 0, 'books': 0, 'branches': 0, 'members': 0, 'copies': 0, 'loans': 0}
-
-        # helper to check existence
-        def exists(query, params=()):
-            cursor.execute(query, params)
-            row = cursor.fetchone()
-            if not row:
-                return False
-            # if row is a tuple with count
-            try:
-                return int(row[0]) > 0
-            except Exception:
-                return True
-
-        # Generate unique publisher names
-        for _ in range(3):
-            name = f"Publisher {uuid.uuid4().hex[:8]}"
-            if not exists("SELECT COUNT(*) FROM Publishers WHERE name=%s", (name,)):
-                cursor.execute("INSERT INTO Publishers (name, address, phone) VALUES (%s, %s, %s)", (name, f"{random.randint(1,999)} Publisher Rd", f"555-{random.randint(1000,9999)}"))
-                inserted['publishers'] += 1
-
-        # Generate unique authors
-        first_names = ['Oliver','Emma','Liam','Ava','Noah','Sophia','Mason','Isabella']
-        last_names = ['Brown','Wilson','Taylor','Anderson','Thomas','Moore','Martin','Lee']
-        for _ in range(6):
-            fn = random.choice(first_names)
-            ln = random.choice(last_names)
-            if not exists("SELECT COUNT(*) FROM Authors WHERE first_name=%s AND last_name=%s", (fn, ln)):
-                cursor.execute("INSERT INTO Authors (first_name, last_name) VALUES (%s, %s)", (fn, ln))
-                inserted['authors'] += 1
-
-        # Ensure there are at least a couple of branches
-        for bname in [f"Branch {uuid.uuid4().hex[:6]}", f"Branch {uuid.uuid4().hex[6:12]}"]:
-            if not exists("SELECT COUNT(*) FROM Library_Branches WHERE name=%s", (bname,)):
-                cursor.execute("INSERT INTO Library_Branches (name, location) VALUES (%s, %s)", (bname, 'Local'))
-                inserted['branches'] += 1
-
-        # Generate unique members
-        for _ in range(6):
-            fn = random.choice(first_names)
-            ln = random.choice(last_names)
-            email = f"{fn.lower()}.{ln.lower()}.{uuid.uuid4().hex[:6]}@example.com"
-            if not exists("SELECT COUNT(*) FROM Members WHERE email=%s", (email,)):
-                cursor.execute("INSERT INTO Members (first_name, last_name, email, address, phone, date_registered) VALUES (%s, %s, %s, %s, %s, CURDATE())",
-                               (fn, ln, email, f"{random.randint(1,999)} Seed St", f"555-{random.randint(1000,9999)}"))
-                inserted['members'] += 1
-
-        # Fetch publisher ids to attach to books
-        cursor.execute("SELECT publisher_id FROM Publishers")
-        publishers = [r[0] for r in cursor.fetchall()]
-        if not publishers:
-            publishers = [1]
-
-        genres = ['Fiction','Science','History','Mystery','Romance','Non-Fiction']
-        # Generate unique books
-        for _ in range(8):
-            # Use ISBN values within signed 32-bit integer range to avoid overflow in INT columns
-            isbn = random.randint(1000000000, 2147483646)
-            if not exists("SELECT COUNT(*) FROM Books WHERE isbn=%s", (isbn,)):
-                title = f"Book {uuid.uuid4().hex[:6]}"
-                genre = random.choice(genres)
-                pub_id = random.choice(publishers)
-                year = random.randint(1990, 2024)
-                try:
-                    cursor.execute("INSERT INTO Books (title, isbn, genre, publisher_id, publication_year) VALUES (%s, %s, %s, %s, %s)",
-                                   (title, isbn, genre, pub_id, year))
-                    inserted['books'] += 1
-                except mysql.connector.IntegrityError:
-                    # skip any primary key conflicts or other integrity issues
-                    continue
-
-        # Create copies for random books at random branches
-        cursor.execute("SELECT isbn FROM Books")
-        book_isbns = [r[0] for r in cursor.fetchall()]
-        cursor.execute("SELECT branch_id FROM Library_Branches")
-        branch_ids = [r[0] for r in cursor.fetchall()]
-        for _ in range(12):
-            if not book_isbns or not branch_ids:
-                break
-            isbn = random.choice(book_isbns)
-            branch_id = random.choice(branch_ids)
-            # randomly include Reserved status sometimes
-            status = random.choices(['Available', 'Reserved'], weights=[0.75, 0.25])[0]
-            # Avoid duplicate identical copy records by checking same isbn+branch+status count
-            if not exists("SELECT COUNT(*) FROM Book_Copies WHERE isbn=%s AND branch_id=%s AND status=%s", (isbn, branch_id, status)):
-                cursor.execute("INSERT INTO Book_Copies (isbn, branch_id, status) VALUES (%s, %s, %s)", (isbn, branch_id, status))
-                inserted['copies'] += 1
-
-        # Create loans for some available copies
-        cursor.execute("SELECT copy_id FROM Book_Copies WHERE status='Available'")
-        available_copies = [r[0] for r in cursor.fetchall()]
-        cursor.execute("SELECT member_id FROM Members")
-        member_ids = [r[0] for r in cursor.fetchall()]
-        random.shuffle(available_copies)
-        for copy_id in available_copies[:8]:
-            if not member_ids:
-                break
-            member_id = random.choice(member_ids)
-            # double-check copy still available
-            if not exists("SELECT COUNT(*) FROM Book_Copies WHERE copy_id=%s AND status='Available'", (copy_id,)):
-                continue
-            # generate varied dates: issue_date in past 60 days
-            days_back = random.randint(0, 60)
-            issue_dt = _datetime.date.today() - _datetime.timedelta(days=days_back)
-            loan_length = random.randint(7, 28)
-            due_dt = issue_dt + _datetime.timedelta(days=loan_length)
-
-            # decide if the loan was returned (some will be returned)
-            returned = random.random() < 0.45
-            return_dt = None
-            fine_amount = None
-            if returned:
-                # return date could be between issue and issue+some days
-                ret_offset = random.randint(1, max(1, loan_length + 12))
-                return_dt = issue_dt + _datetime.timedelta(days=ret_offset)
-                # compute fine if returned after due date
-                if return_dt > due_dt:
-                    days_late = (return_dt - due_dt).days
-                    # fine between 0.5 and 2.0 per day
-                    fine_amount = round(days_late * random.uniform(0.5, 2.0), 2)
-
-            # prepare insert depending on return/fine
-            if return_dt is not None and fine_amount is not None:
-                cursor.execute("INSERT INTO Loans (copy_id, member_id, issue_date, due_date, return_date, fine_amount) VALUES (%s, %s, %s, %s, %s, %s)",
-                               (copy_id, member_id, issue_dt.isoformat(), due_dt.isoformat(), return_dt.isoformat(), fine_amount))
-            elif return_dt is not None:
-                cursor.execute("INSERT INTO Loans (copy_id, member_id, issue_date, due_date, return_date) VALUES (%s, %s, %s, %s, %s)",
-                               (copy_id, member_id, issue_dt.isoformat(), due_dt.isoformat(), return_dt.isoformat()))
-            else:
-                cursor.execute("INSERT INTO Loans (copy_id, member_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
-                               (copy_id, member_id, issue_dt.isoformat(), due_dt.isoformat()))
-
-            inserted['loans'] += 1
-
-            # update copy status: if returned -> Available, else -> On Loan
-            new_status = 'Available' if return_dt is not None else 'On Loan'
-            cursor.execute("UPDATE Book_Copies SET status=%s WHERE copy_id=%s", (new_status, copy_id))
-
-        conn.commit()
-
-        # Dump CSVs for relevant tables
-        try:
-            dump_table_to_csv('Books', 'books.csv')
-            dump_table_to_csv('Book_Copies', 'copies.csv')
-            dump_table_to_csv('Loans', 'loans.csv')
-            dump_table_to_csv('Members', 'members.csv')
-        except Exception:
-            pass
-
-        cursor.close()
-        conn.close()
-        return jsonify({'message': 'Seed completed', 'inserted': inserted}), 201
-    except Exception as e:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        return jsonify({'error': str(e)}), 500
-
-# ==================== DASHBOARD / ANALYTICS ====================
-@app.route('/api/dashboard', methods=['GET'])
-def get_dashboard():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Basic counts
-        cursor.execute("SELECT COUNT(*) AS total_books FROM Books")
-        total_books = cursor.fetchone().get('total_books', 0)
-
-        cursor.execute("SELECT COUNT(*) AS available_copies FROM Book_Copies WHERE status='Available'")
-        available_copies = cursor.fetchone().get('available_copies', 0)
-
-        cursor.execute("SELECT COUNT(*) AS books_on_loan FROM Book_Copies WHERE status='On Loan'")
-        books_on_loan = cursor.fetchone().get('books_on_loan', 0)
-
-        cursor.execute("SELECT COUNT(*) AS reserved_copies FROM Book_Copies WHERE status='Reserved'")
-        reserved_copies = cursor.fetchone().get('reserved_copies', 0)
-
-        cursor.execute("SELECT COUNT(*) AS active_members FROM Members")
-        active_members = cursor.fetchone().get('active_members', 0)
-
-        # Status distribution
-        cursor.execute("SELECT status, COUNT(*) as cnt FROM Book_Copies GROUP BY status")
-        status_rows = cursor.fetchall()
-        status_dist = {row['status']: row['cnt'] for row in status_rows}
-
-        # Loans trend - last 6 weeks (weekly buckets)
-        weeks_back = 6
-        today = _datetime.date.today()
-        # Determine week start (Monday) for current week
-        current_monday = today - _datetime.timedelta(days=today.weekday())
-        week_labels = []
-        week_starts = []
-        for i in range(weeks_back, 0, -1):
-            wk_start = current_monday - _datetime.timedelta(weeks=(i-1))
-            week_starts.append(wk_start)
-            week_labels.append(wk_start.strftime('%Y-%m-%d'))
-
-        # initialize counts
-        week_counts = [0] * weeks_back
-
-        cursor.execute("SELECT issue_date FROM Loans WHERE issue_date >= %s", (week_starts[0],))
-        loan_rows = cursor.fetchall()
-        for r in loan_rows:
-            d = r.get('issue_date')
-            if not d:
-                continue
-            if isinstance(d, _datetime.datetime):
-                d = d.date()
-            for idx, wk_start in enumerate(week_starts):
-                if wk_start <= d < (wk_start + _datetime.timedelta(weeks=1)):
-                    week_counts[idx] += 1
-                    break
-
-        # Top genres
-        cursor.execute("SELECT genre, COUNT(*) as cnt FROM Books GROUP BY genre ORDER BY cnt DESC LIMIT 6")
-        genre_rows = cursor.fetchall()
-        genres = [r['genre'] or 'Unknown' for r in genre_rows]
-        genre_counts = [r['cnt'] for r in genre_rows]
-
-        cursor.close()
-        conn.close()
-
-        return jsonify({
-            'counts': {
-                'total_books': total_books,
-                'available_copies': available_copies,
-                'books_on_loan': books_on_loan,
-                'reserved_copies': reserved_copies,
-                'active_members': active_members
-            },
-            'status_distribution': status_dist,
-            'loans_trend': {
-                'labels': week_labels,
-                'counts': week_counts
-            },
-            'top_genres': {
-                'labels': genres,
-                'counts': genre_counts
-            }
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-if __name__ == '__main__':
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+import click
+import mysql.connector
+from mysql.connector import errorcode
+import sqlite3
+from datetime import datetime
+import datetime as _datetime
+from contextlib import contextmanager
+from decimal import Decimal
+import atexit
+import bisect
+import collections
+import contextvars
+import csv
+import functools
+import hashlib
+import io
+import json
+import math
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode, urljoin
+
+try:
+    import orjson
+except ImportError:  # optional, see json_config
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the change log then assumes a single process, see ChangeLog
+    fcntl = None
+
+DATA_DIR = os.environ.get('LIBRARY_DATA_DIR') or os.path.join(os.path.dirname(__file__), 'data')
+os.makedirs(DATA_DIR, exist_ok=True)
+
+def dump_table_to_csv(table_name, csv_filename):
+    """Dump entire table to CSV file path under DATA_DIR.
+
+    Rows go to a temp file in the same directory that is then renamed over
+    the target, so readers never see a half-written snapshot.
+    """
+    csv_path = os.path.join(DATA_DIR, csv_filename)
+    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, prefix=f'.{csv_filename}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f, get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {table_name}")
+            rows = cursor.fetchall()
+            cols = [d[0] for d in cursor.description]
+            writer = csv.writer(f)
+            writer.writerow(cols)
+            for r in rows:
+                writer.writerow(r)
+            cursor.close()
+        os.replace(tmp_path, csv_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+app = Flask(__name__)
+
+db_config = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '',
+    'database': 'library'
+}
+
+# Connection pool settings:
+#   pool_size    - idle connections kept open between requests
+#   max_overflow - extra connections opened under bursts, closed when returned
+#   timeout      - seconds to wait for a free connection before giving up
+#   recycle      - connections older than this many seconds are reopened
+#   pre_ping     - ping a connection before handing it out
+pool_config = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'timeout': 30,
+    'recycle': 3600,
+    'pre_ping': True
+}
+
+
+# Storage backend, chosen at startup:
+#   'mysql'  - the server in db_config
+#   'sqlite' - embedded database file at sqlite_path (WAL mode), created from DB_Project.sql on first use
+storage_config = {
+    'backend': os.environ.get('LIBRARY_STORAGE', 'mysql'),
+    'sqlite_path': os.environ.get('LIBRARY_SQLITE_PATH') or os.path.join(DATA_DIR, 'library.sqlite3'),
+    # apply pending MIGRATIONS when started with `python app.py` (otherwise run `flask migrate`)
+    'migrate_on_startup': os.environ.get('LIBRARY_MIGRATE', '1') != '0'
+}
+
+# ==================== STORAGE BACKENDS ====================
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), 'DB_Project.sql')
+DB_ERRORS = (mysql.connector.Error, sqlite3.Error)
+
+# the parts of DB_Project.sql that build a database; the rest (CREATE DATABASE / USE,
+# the sample report queries and the demo UPDATE / DELETE statements) is left out
+SCHEMA_STATEMENT = re.compile(r'(CREATE\s+TABLE|CREATE\s+INDEX|DROP|INSERT)\s', re.I)
+
+def schema_statements(path=SCHEMA_FILE):
+    """DDL and sample rows of DB_Project.sql, without comments."""
+    with open(path, encoding='utf-8') as f:
+        text = '\n'.join(line.split('--', 1)[0].rstrip() for line in f)
+    for statement in text.split(';'):
+        statement = statement.strip()
+        if SCHEMA_STATEMENT.match(statement):
+            yield statement
+
+
+class MySQLBackend:
+    name = 'mysql'
+    fulltext = True
+
+    def __init__(self, config):
+        self.config = config
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def ping(self, conn):
+        conn.ping(reconnect=False)
+
+    def index_exists(self, cursor, table, name):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+            (table, name)
+        )
+        return cursor.fetchone() is not None
+
+    def drop_index_sql(self, table, name):
+        return f"DROP INDEX {name} ON {table}"
+
+    @contextmanager
+    def migration_lock(self, cursor):
+        # DDL commits implicitly in MySQL, so concurrent runners are kept apart with a named lock
+        cursor.execute("SELECT GET_LOCK('library_migrations', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError('Timed out waiting for the migration lock')
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('library_migrations')")
+            cursor.fetchone()
+
+    def explain(self, cursor, sql, params):
+        """(indexes used, plan lines) for one statement."""
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [d[0] for d in cursor.description]
+        rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+        lines = [f"{r['table']}: type={r['type']} key={r['key']} rows={r['rows']} {r.get('Extra') or ''}".rstrip()
+                 for r in rows]
+        return [r['key'] for r in rows if r['key']], lines
+
+
+_SQL_STRING = re.compile(r"('(?:[^']|'')*')")
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+
+@functools.lru_cache(maxsize=1024)
+def sqlite_sql(sql):
+    """MySQL statement as the app writes it -> SQLite. String literals are left alone."""
+    parts = _SQL_STRING.split(sql)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\bLIKE\s+%s', r"LIKE %s ESCAPE '\\'", parts[i], flags=re.I)
+        part = _FOR_UPDATE.sub('', part)
+        parts[i] = part.replace('%s', '?')
+    return ''.join(parts)
+
+def sqlite_ddl(statement):
+    """One DB_Project.sql statement -> SQLite statements. Inline indexes become CREATE INDEX,
+    FULLTEXT indexes are dropped (search falls back to LIKE), ENUMs become CHECK constraints."""
+    table = re.match(r'CREATE\s+TABLE\s+(\w+)', statement, re.I)
+    if not table:
+        return [statement]
+    indexes = []
+
+    def index(m):
+        if not m.group(1):
+            indexes.append(f"CREATE INDEX {m.group(2)} ON {table.group(1)} ({m.group(3)})")
+        return ''
+    statement = re.sub(r',\s*(FULLTEXT\s+)?INDEX\s+(\w+)\s*\(([^)]*)\)', index, statement, flags=re.I)
+    statement = re.sub(r'\bINT\s+PRIMARY\s+KEY\s+AUTO_INCREMENT\b', 'INTEGER PRIMARY KEY AUTOINCREMENT', statement, flags=re.I)
+    statement = re.sub(r'(\w+)\s+ENUM\s*\(([^)]*)\)', r'\1 TEXT CHECK (\1 IN (\2))', statement, flags=re.I)
+    statement = re.sub(r'DEFAULT\s+CURDATE\(\)', "DEFAULT (date('now', 'localtime'))", statement, flags=re.I)
+    return [statement] + indexes
+
+def _sql_date(value):
+    return _datetime.date.fromisoformat(str(value)[:10])
+
+def _sql_datediff(a, b):
+    if a is None or b is None:
+        return None
+    return (_sql_date(a) - _sql_date(b)).days
+
+def _sql_greatest(*args):
+    return None if any(a is None for a in args) else max(args)
+
+sqlite3.register_adapter(_datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(_datetime.datetime, lambda d: d.isoformat(' '))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter('DATE', lambda b: _datetime.date.fromisoformat(b.decode()))
+sqlite3.register_converter('DECIMAL', lambda b: Decimal(b.decode()).quantize(Decimal('0.01')))
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over sqlite3: %s placeholders, dictionary rows,
+    and executemany INSERTs that report the first new row id like MySQL does."""
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+        self._lastrowid = None
+        self._rowcount = None
+
+    @property
+    def lastrowid(self):
+        return self._lastrowid if self._lastrowid is not None else self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._rowcount if self._rowcount is not None else self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=()):
+        self._lastrowid = self._rowcount = None
+        if not self._conn.in_transaction and _FOR_UPDATE.search(sql):
+            # no row locks here: take the database write lock before reading instead
+            self._cursor.execute('BEGIN IMMEDIATE')
+        self._cursor.execute(sqlite_sql(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        self._lastrowid = self._rowcount = None
+        sql = sqlite_sql(sql)
+        if not re.match(r'\s*INSERT\b', sql, re.I):
+            self._cursor.executemany(sql, [tuple(p) for p in seq_params])
+            return
+        # one row at a time inside a savepoint, so the batch still succeeds or fails as a whole
+        if not self._conn.in_transaction:
+            self._cursor.execute('BEGIN IMMEDIATE')
+        self._cursor.execute('SAVEPOINT executemany')
+        first, count = None, 0
+        try:
+            for params in seq_params:
+                self._cursor.execute(sql, tuple(params))
+                if first is None:
+                    first = self._cursor.lastrowid
+                count += 1
+        except BaseException:
+            self._cursor.execute('ROLLBACK TO executemany')
+            self._cursor.execute('RELEASE executemany')
+            raise
+        self._cursor.execute('RELEASE executemany')
+        self._lastrowid, self._rowcount = first, count
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(r) for r in self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, buffered=None):
+        # sqlite3 cursors always step lazily, `buffered` has nothing to switch
+        return SQLiteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    fulltext = False
+
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def connect(self):
+        # pooled connections move between request threads, one borrower at a time
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES, isolation_level='IMMEDIATE')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.create_function('CURDATE', 0, lambda: _datetime.date.today().isoformat())
+        conn.create_function('DATEDIFF', 2, _sql_datediff, deterministic=True)
+        conn.create_function('GREATEST', -1, _sql_greatest, deterministic=True)
+        conn.create_function('WEEKDAY', 1, lambda d: None if d is None else _sql_date(d).weekday(), deterministic=True)
+        conn.create_function('DAYOFMONTH', 1, lambda d: None if d is None else _sql_date(d).day, deterministic=True)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._create_schema(conn)
+                    self._ready = True
+        return SQLiteConnection(conn)
+
+    def _create_schema(self, conn):
+        conn.execute('PRAGMA journal_mode = WAL')
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='Books'").fetchone():
+            return
+        statements = [s for statement in schema_statements() for s in sqlite_ddl(statement)]
+        conn.executescript(';\n'.join(statements) + ';')
+
+    def ping(self, conn):
+        conn.cursor().execute('SELECT 1')
+
+    def index_exists(self, cursor, table, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s", (table, name))
+        return cursor.fetchone() is not None
+
+    def drop_index_sql(self, table, name):
+        return f"DROP INDEX {name}"
+
+    @contextmanager
+    def migration_lock(self, cursor):
+        # DDL is transactional here: the whole run is one write transaction
+        cursor.execute('BEGIN IMMEDIATE')
+        yield
+
+    def explain(self, cursor, sql, params):
+        """(indexes used, plan lines) for one statement."""
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        lines = [r[-1] for r in cursor.fetchall()]
+        return re.findall(r'USING (?:COVERING )?INDEX (\w+)', '\n'.join(lines)), lines
+
+
+def make_backend(config):
+    if config['backend'] == 'mysql':
+        return MySQLBackend(db_config)
+    if config['backend'] == 'sqlite':
+        return SQLiteBackend(config['sqlite_path'])
+    raise ValueError(f"Unknown storage backend: {config['backend']}")
+
+
+backend = make_backend(storage_config)
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of database connections from a storage backend.
+
+    At most pool_size + max_overflow connections are checked out at once;
+    callers beyond that wait up to `timeout` seconds. Only pool_size
+    connections are kept idle, overflow connections are closed on release.
+    """
+
+    def __init__(self, backend, pool_size=5, max_overflow=10, timeout=30, recycle=3600, pre_ping=True):
+        self.backend = backend
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size + max_overflow)
+        self._born = {}
+
+    def _open(self):
+        conn = self.backend.connect()
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn):
+        if self.recycle is None or self.recycle < 0:
+            return False
+        return time.monotonic() - self._born.get(id(conn), 0) > self.recycle
+
+    def _healthy(self, conn):
+        if not self.pre_ping:
+            return True
+        try:
+            self.backend.ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'No database connection available after {self.timeout}s')
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if not self._expired(conn) and self._healthy(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            # end any transaction left open so the next borrower starts clean
+            conn.rollback()
+            if self._expired(conn) or self._idle.qsize() >= self.pool_size:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        except Exception:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def dispose(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+pool = ConnectionPool(backend, **pool_config)
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection; it is always handed back, uncommitted work is rolled back."""
+    stats = request_stats.get()
+    if stats is None:
+        conn = pool.acquire()
+    else:
+        started = time.perf_counter()
+        conn = pool.acquire()
+        metrics.pool_wait.observe(time.perf_counter() - started)
+    metered = None if stats is None else MeteredConnection(conn, stats)
+    try:
+        yield conn if metered is None else metered
+    finally:
+        if metered is not None:
+            metered.finish()
+        pool.release(conn)
+
+# ==================== METRICS ====================
+# Request and SQL instrumentation, served in the Prometheus text format at /metrics.
+# Counters live in this process: scrape every worker of a multi-process server.
+metrics_config = {
+    'enabled': os.environ.get('LIBRARY_METRICS', '1') != '0'
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{metric_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted((k, (list(counts), total)) for k, (counts, total) in self._series.items())
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = metric_labels(self.labels + ('le',), label_values + (str(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = metric_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+def metric_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        route = ('route', 'method')
+        self.latency = Histogram('library_http_request_duration_seconds',
+                                 'Time from routing a request to finishing its response.', LATENCY_BUCKETS, route)
+        self.requests = Counter('library_http_requests_total', 'Requests answered.', route + ('status',))
+        self.errors = Counter('library_http_request_errors_total',
+                              'Requests that failed with an exception, by exception type.', route + ('exception',))
+        self.statements = Histogram('library_sql_statements_per_request',
+                                    'SQL statements executed per request.', COUNT_BUCKETS, route)
+        self.rows = Histogram('library_sql_rows_fetched_per_request',
+                              'Rows fetched from the database per request.', COUNT_BUCKETS, route)
+        self.pool_wait = Histogram('library_pool_wait_seconds',
+                                   'Time requests waited for a pooled database connection.', LATENCY_BUCKETS)
+
+    def render(self):
+        families = (self.latency, self.requests, self.errors, self.statements, self.rows, self.pool_wait)
+        return '\n'.join(line for family in families for line in family.render()) + '\n'
+
+metrics = Metrics()
+
+
+class RequestStats:
+    __slots__ = ('started', 'route', 'statements', 'rows', 'status', 'streamed', 'error', 'profile')
+
+    def __init__(self, route, profile=None):
+        self.started = time.perf_counter()
+        self.route = route
+        self.statements = self.rows = 0
+        self.status = None
+        self.streamed = False
+        self.error = None
+        self.profile = profile
+
+# the current request's RequestStats; None outside requests, so CLI commands and background threads skip the metering
+request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class MeteredCursor:
+    """Cursor that counts statements and fetched rows into a RequestStats."""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def execute(self, *args, **kwargs):
+        self._stats.statements += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._stats.statements += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class MeteredConnection:
+    def __init__(self, conn, stats):
+        self._conn = conn
+        self._stats = stats
+        self._profiled = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if self._stats.profile is None:
+            return MeteredCursor(cursor, self._stats)
+        cursor = ProfiledCursor(cursor, self._stats, self._conn)
+        self._profiled.append(cursor)
+        return cursor
+
+    def finish(self):
+        """Close out the statements still open on this connection's profiled cursors."""
+        for cursor in self._profiled:
+            cursor.finish()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def record_error(e):
+    """Count an exception a route caught and answered itself."""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.error = type(e).__name__
+
+def error_response(e):
+    record_error(e)
+    return jsonify({'error': str(e)}), 500
+
+@app.before_request
+def start_request_stats():
+    profile = start_profile()
+    if metrics_config['enabled'] or profile is not None:
+        route = (request.url_rule.rule if request.url_rule else 'unmatched', request.method)
+        request_stats.set(RequestStats(route, profile))
+
+@app.after_request
+def note_request_status(response):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.status = response.status_code
+        stats.streamed = response.is_streamed
+        if stats.profile is not None and stats.profile.timeline is not None:
+            profile_headers(response, stats)
+    return response
+
+@app.teardown_request
+def record_request_stats(exc):
+    stats = request_stats.get()
+    if stats is None:
+        return
+    if stats.streamed and exc is None:
+        # stream_with_context tears the request down again once the body is sent: record then
+        stats.streamed = False
+        return
+    request_stats.set(None)
+    if stats.profile is not None:
+        stats.profile.close(stats)
+    if not metrics_config['enabled']:
+        return
+    route = stats.route
+    metrics.latency.observe(time.perf_counter() - stats.started, *route)
+    metrics.statements.observe(stats.statements, *route)
+    metrics.rows.observe(stats.rows, *route)
+    metrics.requests.inc(*route, str(stats.status or 500))
+    error = type(exc).__name__ if exc is not None else stats.error
+    if error is not None:
+        metrics.errors.inc(*route, error)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# ==================== QUERY PROFILING ====================
+# Statement profiling, off unless configured:
+#   slow_query_ms - log statements that take at least this long (app logger and GET /api/debug/slow-queries)
+#   explain       - attach the EXPLAIN plan of each logged statement
+#   timeline      - honour `X-Profile-Queries: 1` on a request: record its whole statement timeline,
+#                   served at GET /api/debug/queries/<id>. Exposes SQL, keep it off in production
+#   keep          - timelines and slow statements kept in memory
+profile_config = {
+    'slow_query_ms': float(os.environ['LIBRARY_SLOW_QUERY_MS']) if os.environ.get('LIBRARY_SLOW_QUERY_MS') else None,
+    'explain': os.environ.get('LIBRARY_SLOW_QUERY_EXPLAIN', '1') != '0',
+    'timeline': os.environ.get('LIBRARY_PROFILE_QUERIES', '0') == '1',
+    'keep': 200
+}
+
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_SQL_COMMA = re.compile(r'\s*,\s*')
+_SQL_IN_LIST = re.compile(r'\bIN \(\?(?:, \?)+\)', re.I)
+_SQL_VALUES_ROWS = re.compile(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+_EXPLAINABLE = re.compile(r'\s*(SELECT|UPDATE|DELETE)\b', re.I)
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Statement text with literals and placeholders as ?, and IN lists / VALUES rows folded,
+    so repeats of one statement read the same."""
+    sql = _SQL_COMMA.sub(', ', _SQL_LITERAL.sub('?', ' '.join(sql.split())))
+    return _SQL_VALUES_ROWS.sub(r'\1, ...', _SQL_IN_LIST.sub('IN (?, ...)', sql))
+
+
+class QueryEntry:
+    __slots__ = ('sql', 'params', 'many', 'offset', 'seconds', 'rows', 'error', 'plan')
+
+    def __init__(self, sql, params, many, offset):
+        self.sql, self.params, self.many, self.offset = sql, params, many, offset
+        self.seconds = 0.0
+        self.rows = 0
+        self.error = None
+        self.plan = None
+
+    def to_dict(self):
+        entry = {
+            'offset_ms': round(self.offset * 1000, 3),
+            'duration_ms': round(self.seconds * 1000, 3),
+            'rows': self.rows,
+            'sql': normalize_sql(self.sql)
+        }
+        if self.many:
+            entry['executemany'] = True
+        if self.error:
+            entry['error'] = self.error
+        if self.plan:
+            entry['plan'] = self.plan
+        return entry
+
+
+class QueryProfile:
+    """The profiled statements of one request."""
+
+    def __init__(self, timeline):
+        self.id = os.urandom(8).hex()
+        self.timeline = [] if timeline else None
+
+    def record(self, entry, conn, stats):
+        """Add a finished statement; `conn` is the connection it ran on, for EXPLAIN (None: no plan)."""
+        if self.timeline is not None:
+            self.timeline.append(entry)
+        threshold = profile_config['slow_query_ms']
+        if threshold is None or entry.seconds * 1000 < threshold:
+            return
+        if profile_config['explain'] and conn is not None and not entry.many and _EXPLAINABLE.match(entry.sql):
+            entry.plan = explain_plan(conn, entry.sql, entry.params)
+        slow = dict(entry.to_dict(), route=' '.join(reversed(stats.route)), at=datetime.now().isoformat(timespec='seconds'))
+        slow.pop('offset_ms')
+        slow_queries.append(slow)
+        app.logger.warning('Slow query (%.1f ms, %d rows) in %s: %s', entry.seconds * 1000, entry.rows,
+                           slow['route'], slow['sql'])
+
+    def close(self, stats):
+        if self.timeline is None:
+            return
+        entries = sorted(self.timeline, key=lambda e: e.offset)
+        repeated = {}
+        for entry in entries:
+            sql = normalize_sql(entry.sql)
+            count, seconds = repeated.get(sql, (0, 0.0))
+            repeated[sql] = (count + 1, seconds + entry.seconds)
+        query_profiles.put(self.id, {
+            'id': self.id,
+            'route': stats.route[0],
+            'method': stats.route[1],
+            'path': request.full_path.rstrip('?'),
+            'status': stats.status,
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round((time.perf_counter() - stats.started) * 1000, 3),
+            'statements': len(entries),
+            'sql_ms': round(sum(e.seconds for e in entries) * 1000, 3),
+            # the same statement run again and again, most frequent first: the N+1 candidates
+            'repeated': [{'sql': sql, 'count': count, 'total_ms': round(seconds * 1000, 3)}
+                         for sql, (count, seconds) in sorted(repeated.items(), key=lambda r: -r[1][0]) if count > 1],
+            'queries': [e.to_dict() for e in entries]
+        })
+
+
+class ProfileStore:
+    """The last `keep` request timelines, oldest dropped first."""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self._profiles = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, profile):
+        with self._lock:
+            self._profiles[key] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._profiles.get(key)
+
+    def summaries(self):
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [{k: v for k, v in p.items() if k not in ('repeated', 'queries')} for p in reversed(profiles)]
+
+query_profiles = ProfileStore(profile_config['keep'])
+slow_queries = collections.deque(maxlen=profile_config['keep'])
+
+
+class ProfiledCursor(MeteredCursor):
+    """MeteredCursor that also times each statement, including the fetches of its rows,
+    and hands it to the request's QueryProfile once the next statement starts or the cursor closes."""
+
+    def __init__(self, cursor, stats, conn):
+        super().__init__(cursor, stats)
+        self._conn = conn
+        self._entry = None
+
+    def _run(self, method, sql, params, many):
+        self.finish()
+        started = time.perf_counter()
+        entry = QueryEntry(sql, params, many, started - self._stats.started)
+        try:
+            return method(sql, params)
+        except Exception as e:
+            entry.error = type(e).__name__
+            raise
+        finally:
+            entry.seconds = time.perf_counter() - started
+            if self._cursor.description is None:
+                entry.rows = max(self._cursor.rowcount or 0, 0)
+            self._entry = entry
+
+    def execute(self, sql, params=()):
+        return self._run(super().execute, sql, params, False)
+
+    def executemany(self, sql, seq_params):
+        return self._run(super().executemany, sql, seq_params, True)
+
+    def _fetched(self, started, count):
+        if self._entry is not None:
+            self._entry.seconds += time.perf_counter() - started
+            self._entry.rows += count
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def finish(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._stats.profile.record(entry, self._conn, self._stats)
+
+    def close(self):
+        self.finish()
+        return self._cursor.close()
+
+
+def explain_plan(conn, sql, params):
+    """Plan lines of one statement, on its own cursor of the connection that ran it."""
+    try:
+        cursor = conn.cursor(buffered=True)
+        try:
+            return backend.explain(cursor, sql, params)[1]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+
+def start_profile():
+    """QueryProfile for the current request, or None when it is not profiled."""
+    timeline = profile_config['timeline'] and request.headers.get('X-Profile-Queries') == '1'
+    if timeline or profile_config['slow_query_ms'] is not None:
+        return QueryProfile(timeline)
+    return None
+
+def profile_headers(response, stats):
+    response.headers['X-Query-Profile'] = stats.profile.id
+    response.headers['X-Query-Count'] = str(len(stats.profile.timeline))
+    response.headers['X-Query-Time-Ms'] = f"{sum(e.seconds for e in stats.profile.timeline) * 1000:.3f}"
+
+@app.route('/api/debug/queries', methods=['GET'])
+def list_query_profiles():
+    if not profile_config['timeline']:
+        return jsonify({'error': 'Query timelines are off (LIBRARY_PROFILE_QUERIES=1)'}), 404
+    return jsonify(query_profiles.summaries())
+
+@app.route('/api/debug/queries/<profile_id>', methods=['GET'])
+def get_query_profile(profile_id):
+    profile = query_profiles.get(profile_id) if profile_config['timeline'] else None
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(profile)
+
+@app.route('/api/debug/slow-queries', methods=['GET'])
+def list_slow_queries():
+    if profile_config['slow_query_ms'] is None:
+        return jsonify({'error': 'The slow query log is off (LIBRARY_SLOW_QUERY_MS)'}), 404
+    return jsonify({'threshold_ms': profile_config['slow_query_ms'], 'queries': list(reversed(slow_queries))})
+
+# ==================== MIGRATIONS ====================
+# (version, description, operations). Released migrations are never edited, only appended to.
+# DB_Project.sql stays the baseline schema: every index and table added since then is created here
+# and only here. Operations are idempotent, so a database that already has an index (for example
+# one built from an older copy of DB_Project.sql that declared it inline) just records the version.
+#   ('index', table, name, columns)    - CREATE INDEX unless it exists
+#   ('fulltext', table, name, columns) - CREATE FULLTEXT INDEX; skipped on backends without FULLTEXT
+#   ('drop_index', table, name)        - DROP INDEX if it exists
+#   ('table', table, columns)          - CREATE TABLE IF NOT EXISTS
+#   ('sql', table, statement)          - run as is; the statement itself must be safe to repeat
+MIGRATIONS = [
+    (1, 'Secondary indexes for dashboard, loans trend and delete cascades', [
+        ('index', 'Book_Copies', 'idx_copies_status', ['status']),
+        ('index', 'Books', 'idx_books_genre', ['genre']),
+        ('index', 'Loans', 'idx_loans_issue_date', ['issue_date']),
+        ('index', 'Loans', 'idx_loans_copy_return', ['copy_id', 'return_date']),
+        ('index', 'Loans', 'idx_loans_member_return', ['member_id', 'return_date'])
+    ]),
+    (2, 'Copies by title, branch and status', [
+        ('index', 'Book_Copies', 'idx_copies_isbn_branch_status', ['isbn', 'branch_id', 'status']),
+        # now a prefix of the index above
+        ('drop_index', 'Book_Copies', 'idx_copies_isbn_branch')
+    ]),
+    (3, 'Search indexes', [
+        ('index', 'Books', 'idx_books_title', ['title']),
+        ('index', 'Members', 'idx_members_first_name', ['first_name']),
+        ('index', 'Members', 'idx_members_last_name', ['last_name']),
+        ('fulltext', 'Books', 'ft_books_title', ['title']),
+        ('fulltext', 'Members', 'ft_members_name_email', ['first_name', 'last_name', 'email'])
+    ]),
+    (4, 'Copy counts per title and branch', [
+        ('table', 'Copy_Availability', 'isbn INT NOT NULL, branch_id INT NOT NULL, '
+         'available INT NOT NULL DEFAULT 0, on_loan INT NOT NULL DEFAULT 0, reserved INT NOT NULL DEFAULT 0, '
+         'PRIMARY KEY (isbn, branch_id)'),
+        ('sql', 'Copy_Availability', 'DELETE FROM Copy_Availability'),
+        ('sql', 'Copy_Availability',
+         "INSERT INTO Copy_Availability (isbn, branch_id, available, on_loan, reserved) "
+         "SELECT isbn, branch_id, SUM(CASE WHEN status = 'Available' THEN 1 ELSE 0 END), "
+         "SUM(CASE WHEN status = 'On Loan' THEN 1 ELSE 0 END), SUM(CASE WHEN status = 'Reserved' THEN 1 ELSE 0 END) "
+         "FROM Book_Copies WHERE isbn IS NOT NULL AND branch_id IS NOT NULL GROUP BY isbn, branch_id")
+    ]),
+    (5, 'Open loans by due date and by member', [
+        ('index', 'Loans', 'idx_loans_open_due', ['return_date', 'due_date', 'fine_amount']),
+        ('index', 'Loans', 'idx_loans_open_member', ['return_date', 'member_id', 'due_date'])
+    ]),
+    (6, 'Checkpoints of chunked bulk deletes', [
+        ('table', 'Delete_Runs', 'run_id VARCHAR(16) PRIMARY KEY, entity VARCHAR(20) NOT NULL, ids LONGTEXT NOT NULL, '
+         "done INT NOT NULL DEFAULT 0, counts TEXT NOT NULL, status VARCHAR(10) NOT NULL DEFAULT 'running', "
+         'error TEXT, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL'),
+        ('index', 'Delete_Runs', 'idx_delete_runs_status', ['status', 'created_at'])
+    ]),
+    (7, 'Background job records', [
+        ('table', 'Jobs', 'job_id VARCHAR(16) PRIMARY KEY, kind VARCHAR(30) NOT NULL, params LONGTEXT NOT NULL, '
+         "status VARCHAR(10) NOT NULL DEFAULT 'queued', progress TEXT, result LONGTEXT, error TEXT, "
+         'cancel_requested INT NOT NULL DEFAULT 0, created_at DATETIME NOT NULL, started_at DATETIME, '
+         'finished_at DATETIME, updated_at DATETIME NOT NULL'),
+        ('index', 'Jobs', 'idx_jobs_created', ['created_at'])
+    ]),
+    (8, 'List endpoint filters', [
+        ('index', 'Books', 'idx_books_publisher', ['publisher_id']),
+        ('index', 'Books', 'idx_books_publication_year', ['publication_year']),
+        ('index', 'Book_Copies', 'idx_copies_branch_status', ['branch_id', 'status']),
+        ('index', 'Loans', 'idx_loans_due_date', ['due_date'])
+    ]),
+    (9, 'Table versions for ETags', [
+        ('table', 'Table_Versions', 'table_name VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0'),
+        ('sql', 'Table_Versions', 'DELETE FROM Table_Versions'),
+        ('sql', 'Table_Versions',
+         "INSERT INTO Table_Versions (table_name, version) VALUES ('Authors', 0), ('Book_Authors', 0), "
+         "('Book_Copies', 0), ('Books', 0), ('Copy_Availability', 0), ('Library_Branches', 0), ('Loans', 0), "
+         "('Members', 0), ('Publishers', 0)")
+    ])
+]
+
+SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "version INT PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at DATETIME NOT NULL)"
+)
+
+# Hot predicates in the routes and the index each should use once the migrations are applied.
+# `flask explain` prints their plans, before and after `flask migrate`.
+INDEX_CHECKS = [
+    ('dashboard copies by status', "SELECT status, COUNT(*) AS cnt FROM Book_Copies GROUP BY status", (),
+     'idx_copies_status'),
+    ('dashboard top genres', "SELECT genre, COUNT(*) AS cnt FROM Books GROUP BY genre", (),
+     'idx_books_genre'),
+    ('loans trend', "SELECT issue_date, COUNT(*) AS cnt FROM Loans WHERE issue_date >= %s AND issue_date < %s "
+     "GROUP BY issue_date", ('2024-01-01', '2024-03-01'), 'idx_loans_issue_date'),
+    ('cascade: loans of copies', "SELECT loan_id FROM Loans WHERE copy_id IN (%s, %s)", (1, 2),
+     'idx_loans_copy_return'),
+    ('cascade: loans of members', "SELECT loan_id FROM Loans WHERE member_id IN (%s, %s)", (1, 2),
+     'idx_loans_member_return'),
+    ('copies of a title at a branch', "SELECT copy_id FROM Book_Copies WHERE isbn = %s AND branch_id = %s "
+     "AND status = %s", (1001, 1, 'Available'), 'idx_copies_isbn_branch_status'),
+    ('overdue loans', "SELECT MIN(due_date) FROM Loans WHERE return_date IS NULL AND due_date < %s",
+     ('2024-03-01',), 'idx_loans_open_due'),
+    ('overdue report by member', "SELECT member_id, COUNT(*) FROM Loans WHERE return_date IS NULL AND due_date < %s "
+     "AND member_id > %s GROUP BY member_id ORDER BY member_id LIMIT 100", ('2024-03-01', 0), 'idx_loans_open_member'),
+    ('book detail open loans', "SELECT c.isbn, COUNT(*) FROM Book_Copies c JOIN Loans l ON l.copy_id = c.copy_id "
+     "WHERE c.isbn IN (%s, %s) AND l.return_date IS NULL GROUP BY c.isbn", (1001, 1002), 'idx_loans_copy_return'),
+    ('books by publication year', "SELECT * FROM Books WHERE publication_year = %s ORDER BY isbn LIMIT %s",
+     (1997, 101), 'idx_books_publication_year'),
+    ('copies at a branch', "SELECT * FROM Book_Copies WHERE branch_id = %s AND status = %s ORDER BY copy_id LIMIT %s",
+     (1, 'Available', 101), 'idx_copies_branch_status'),
+    ('loans due in a range', "SELECT * FROM Loans WHERE due_date >= %s AND due_date <= %s ORDER BY loan_id LIMIT %s",
+     ('2024-03-01', '2024-03-07', 101), 'idx_loans_due_date')
+]
+
+def apply_migration_op(cursor, op):
+    kind, table, name = op[:3]
+    if kind == 'table':
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({name})")
+        return
+    if kind == 'sql':
+        cursor.execute(name)
+        return
+    exists = backend.index_exists(cursor, table, name)
+    if kind == 'drop_index':
+        if exists:
+            cursor.execute(backend.drop_index_sql(table, name))
+    elif not exists and (kind == 'index' or backend.fulltext):
+        fulltext = 'FULLTEXT ' if kind == 'fulltext' else ''
+        cursor.execute(f"CREATE {fulltext}INDEX {name} ON {table} ({', '.join(op[3])})")
+
+def migrate(conn, target=None):
+    """Apply pending MIGRATIONS up to `target` (default: all) in order; returns the versions applied."""
+    cursor = conn.cursor()
+    applied = []
+    with backend.migration_lock(cursor):
+        cursor.execute(SCHEMA_VERSION_DDL)
+        cursor.execute("SELECT version FROM schema_version")
+        done = {r[0] for r in cursor.fetchall()}
+        for version, description, ops in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            for op in ops:
+                apply_migration_op(cursor, op)
+            cursor.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                           (version, description, datetime.now()))
+            applied.append(version)
+        conn.commit()
+    cursor.close()
+    return applied
+
+def schema_status(conn):
+    cursor = conn.cursor()
+    cursor.execute(SCHEMA_VERSION_DDL)
+    cursor.execute("SELECT version, applied_at FROM schema_version")
+    done = dict(cursor.fetchall())
+    conn.commit()
+    cursor.close()
+    return [{'version': v, 'description': d, 'applied_at': str(done[v]) if v in done else None}
+            for v, d, _ in MIGRATIONS]
+
+@app.cli.command('migrate')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this version.')
+@click.option('--status', is_flag=True, help='List migrations and whether they are applied, change nothing.')
+def migrate_command(target, status):
+    """Apply pending schema migrations."""
+    with get_connection() as conn:
+        if status:
+            for m in schema_status(conn):
+                click.echo(f"{m['version']:>4}  {m['applied_at'] or 'pending':<26}  {m['description']}")
+            return
+        applied = migrate(conn, target)
+    click.echo(f"Applied: {', '.join(map(str, applied))}" if applied else 'Schema is up to date')
+
+@app.cli.command('explain')
+def explain_command():
+    """Show the plans of INDEX_CHECKS; exits with status 1 if one does not use its index.
+
+    Optimizers skip indexes on tiny tables, so run this against realistic data (see `flask seed`)."""
+    misses = 0
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for name, sql, params, index in INDEX_CHECKS:
+            used, lines = backend.explain(cursor, sql, params)
+            misses += index not in used
+            click.echo(f"{'ok  ' if index in used else 'MISS'}  {name}: wants {index}, uses {', '.join(used) or 'no index'}")
+            for line in lines:
+                click.echo(f'        {line}')
+        cursor.close()
+    if misses:
+        raise SystemExit(1)
+
+@app.after_request
+def after_request(response):
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, X-Profile-Queries')
+    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Next-Cursor, Link, ETag, X-Query-Profile, X-Query-Count, X-Query-Time-Ms')
+    return response
+
+# ==================== JSON ====================
+# Response encoder: 'orjson' (optional dependency), 'stdlib', or 'auto' to use orjson when installed
+json_config = {
+    'encoder': os.environ.get('LIBRARY_JSON_ENCODER', 'auto')
+}
+
+def json_default(value):
+    """Values the encoders have no JSON type for: dates as ISO 8601 strings, Decimal as an exact string."""
+    if isinstance(value, (_datetime.date, _datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(json_default)
+    sort_keys = False
+
+
+class OrjsonProvider(JSONProvider):
+    """Encodes in C: dicts, lists, tuples, dates and datetimes natively, Decimal through json_default."""
+    options = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=json_default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=json_default, option=self.options),
+                                        mimetype='application/json')
+
+
+def make_json_provider(config):
+    encoder = config['encoder']
+    if encoder == 'auto':
+        encoder = 'orjson' if orjson is not None else 'stdlib'
+    if encoder == 'orjson':
+        if orjson is None:
+            raise RuntimeError('The orjson encoder is configured but orjson is not installed')
+        return OrjsonProvider(app)
+    if encoder == 'stdlib':
+        return StdlibJSONProvider(app)
+    raise ValueError(f'Unknown JSON encoder: {encoder}')
+
+
+app.json = make_json_provider(json_config)
+
+# ==================== ENTITIES ====================
+# API name -> table, primary key and columns, used wherever a table or
+# column name comes from the request and has to be whitelisted
+ENTITIES = {
+    'books': {'table': 'Books', 'pk': 'isbn',
+              'columns': ['isbn', 'title', 'publisher_id', 'publication_year', 'genre']},
+    'members': {'table': 'Members', 'pk': 'member_id',
+                'columns': ['member_id', 'first_name', 'last_name', 'email', 'address', 'phone', 'date_registered']},
+    'loans': {'table': 'Loans', 'pk': 'loan_id',
+              'columns': ['loan_id', 'copy_id', 'member_id', 'issue_date', 'due_date', 'return_date', 'fine_amount']},
+    'copies': {'table': 'Book_Copies', 'pk': 'copy_id',
+               'columns': ['copy_id', 'isbn', 'branch_id', 'status']},
+    'branches': {'table': 'Library_Branches', 'pk': 'branch_id',
+                 'columns': ['branch_id', 'name', 'location']},
+    'publishers': {'table': 'Publishers', 'pk': 'publisher_id',
+                   'columns': ['publisher_id', 'name', 'address', 'phone']},
+    'authors': {'table': 'Authors', 'pk': 'author_id',
+                'columns': ['author_id', 'first_name', 'last_name']}
+}
+TABLE_PKS = {meta['table']: meta['pk'] for meta in ENTITIES.values()}
+
+# ==================== PAGINATION ====================
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+PAGE_FORMATS = ('rows', 'columns')
+
+def page_args():
+    """Read ?after=<pk>&limit=N&format= from the query string. Raises ValueError on bad input."""
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    try:
+        after = int(after) if after not in (None, '') else None
+        limit = int(limit) if limit not in (None, '') else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError('after and limit must be integers')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    if (request.args.get('format') or 'rows') not in PAGE_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(PAGE_FORMATS)}")
+    return after, min(limit, MAX_PAGE_SIZE)
+
+def flag_arg(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(value)
+
+def copy_status_arg(value):
+    if value not in COPY_STATUSES:
+        raise ValueError(value)
+    return value
+
+# Filters of the list endpoints: query parameter -> (column, operator, parse). The parsed value is
+# bound as `column operator %s`; with the operator 'null' a true value means `column IS NULL`
+# and a false one `column IS NOT NULL`. Each column has an index from migration 8 or earlier.
+LIST_FILTERS = {
+    'books': {
+        'genre': ('genre', '=', str),
+        'publisher_id': ('publisher_id', '=', int),
+        'publication_year': ('publication_year', '=', int)
+    },
+    'copies': {
+        'isbn': ('isbn', '=', int),
+        'branch_id': ('branch_id', '=', int),
+        'status': ('status', '=', copy_status_arg)
+    },
+    'loans': {
+        'member_id': ('member_id', '=', int),
+        'copy_id': ('copy_id', '=', int),
+        'open': ('return_date', 'null', flag_arg),
+        'due_from': ('due_date', '>=', _datetime.date.fromisoformat),
+        'due_to': ('due_date', '<=', _datetime.date.fromisoformat)
+    }
+}
+
+def list_args(entity):
+    """Read ?fields=a,b and the entity's LIST_FILTERS from the query string. Returns (fields, filters):
+    the requested columns (None for all of them) and (sql, params) conditions for page_query.
+    Raises ValueError on unknown fields or filter values that do not parse."""
+    columns = ENTITIES[entity]['columns']
+    fields = None
+    if request.args.get('fields'):
+        fields = list(dict.fromkeys(f.strip() for f in request.args['fields'].split(',') if f.strip()))
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)} (fields of {entity}: {', '.join(columns)})")
+    filters = []
+    for name, (column, operator, parse) in LIST_FILTERS.get(entity, {}).items():
+        value = request.args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            value = parse(value)
+        except ValueError:
+            raise ValueError(f'Invalid value for {name}: {value}')
+        if operator == 'null':
+            filters.append((f"{column} IS NULL" if value else f"{column} IS NOT NULL", ()))
+        else:
+            filters.append((f"{column} {operator} %s", (value,)))
+    return fields, filters
+
+def page_query(table, pk, after, limit, fields=None, filters=()):
+    """(sql, params) of a keyset page ordered by the primary key. `fields` limits the columns
+    (the primary key is selected first regardless, for the cursor); `filters` are (sql, params)
+    conditions from list_args, with column names that never come from the request."""
+    select = '*'
+    if fields:
+        select = ', '.join([pk] + [f for f in fields if f != pk])
+    conditions = [sql for sql, _ in filters]
+    params = [p for _, values in filters for p in values]
+    if after is not None:
+        conditions.append(f"{pk} > %s")
+        params.append(after)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    # fetch one extra row to know whether another page exists
+    return f"SELECT {select} FROM {table}{where} ORDER BY {pk} LIMIT %s", (*params, limit + 1)
+
+def split_page(columns, rows, pk, limit, fields=None):
+    """Drop the look-ahead row of a page_query result, and the primary key when `fields` leaves it
+    out. Returns (columns, rows, next_cursor)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows.pop()
+        next_cursor = rows[-1][columns.index(pk)]
+    if fields and pk not in fields:
+        columns, rows = columns[1:], [r[1:] for r in rows]
+    return columns, rows, next_cursor
+
+def fetch_page(cursor, table, pk, after, limit, fields=None, filters=()):
+    """Keyset page of `table` ordered by its primary key, read through a plain (tuple) cursor.
+    Returns (columns, rows, next_cursor)."""
+    cursor.execute(*page_query(table, pk, after, limit, fields, filters))
+    rows = cursor.fetchall()
+    return split_page([d[0] for d in cursor.description], rows, pk, limit, fields)
+
+def page_response(columns, rows, next_cursor, etag):
+    """JSON array of row objects, or with ?format=columns {"columns": [...], "rows": [[...], ...]}
+    straight from the cursor's tuples. The cursor for the next page travels in X-Next-Cursor / Link."""
+    if request.args.get('format') == 'columns':
+        response = jsonify({'columns': columns, 'rows': rows})
+    else:
+        response = jsonify([dict(zip(columns, r)) for r in rows])
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return tag_response(response, etag)
+
+# ==================== CACHING ====================
+DASHBOARD_CACHE_TTL = 30  # seconds
+VERSION_CACHE_TTL = 1  # seconds; how long another process's writes can take to move this process's ETags
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry.
+
+    invalidate() bumps a generation counter so a fill that started before
+    a write committed cannot store its (now stale) result afterwards.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key, value, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+DASHBOARD_TABLES = {'Books', 'Book_Copies', 'Loans', 'Members'}
+
+
+class TableVersions:
+    """Per-table change counters, kept in the Table_Versions table (migration 9).
+
+    Writers bump them inside the transaction that changed the tables (commit_changes),
+    so a write from any process sharing the database - another worker, a CLI command,
+    cron - moves the ETags of everything that reads those tables. ETags hash the versions
+    of the tables a response reads.
+
+    The whole table (one row per tracked table) is kept in process for `ttl` seconds, so
+    most conditional requests are answered without a database round trip. Writes in this
+    process drop the copy right after they commit (tables_changed); writes from other
+    processes show up in this process's ETags within `ttl`.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._versions = None
+        self._expires = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def query(self):
+        return "SELECT table_name, version FROM Table_Versions", ()
+
+    def generation(self):
+        return self._generation
+
+    def cached(self, tables):
+        """{table: version} from the in-process copy, or None if it expired or lacks one of `tables`."""
+        with self._lock:
+            versions = self._versions
+            if versions is None or self._expires < time.monotonic() or not versions.keys() >= set(tables):
+                return None
+            return versions
+
+    def store(self, versions, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._versions = versions
+                self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._versions = None
+
+    def read(self, tables):
+        """{table: version}, or None if they cannot be read (e.g. before migration 9)."""
+        versions = self.cached(tables)
+        if versions is not None:
+            return versions
+        generation = self.generation()
+        try:
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(*self.query())
+                versions = dict(cursor.fetchall())
+                cursor.close()
+        except Exception as e:
+            app.logger.warning('Cannot read table versions, answering without ETags: %s', e)
+            return None
+        self.store(versions, generation)
+        return versions
+
+    def etag(self, tables, versions, *parts):
+        if versions is None:
+            return None
+        versions = [f'{t}={versions.get(t, 0)}' for t in sorted(tables)]
+        return hashlib.sha1('|'.join([*versions, *map(str, parts)]).encode()).hexdigest()
+
+
+table_versions = TableVersions(VERSION_CACHE_TTL)
+
+def check_etag(tables, *parts, versions=None):
+    """ETag for this request reading `tables`, plus a 304 response if the client already holds it.
+    Pass `versions` if they were already read (the ASGI routes read them on the event loop).
+
+    Call before touching the database: the versions are read first, so a write
+    racing with the query can only leave the tag older than the body, never newer.
+    """
+    if versions is None:
+        versions = table_versions.read(tables)
+    etag = table_versions.etag(tables, versions, request.full_path, *parts)
+    if etag is not None and etag in request.if_none_match:
+        return etag, tag_response(Response(status=304), etag)
+    return etag, None
+
+def tag_response(response, etag):
+    if etag is not None:
+        response.set_etag(etag)
+    # let browsers keep the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ==================== CSV SNAPSHOTS ====================
+SNAPSHOT_FILES = {
+    'Books': 'books.csv',
+    'Book_Copies': 'copies.csv',
+    'Loans': 'loans.csv',
+    'Members': 'members.csv'
+}
+SNAPSHOT_DEBOUNCE = 1   # seconds to let a burst of writes settle before dumping
+SNAPSHOT_INTERVAL = 60  # minimum seconds between two dumps (and log compactions) of the same table
+
+class SnapshotWriter:
+    """Background thread that keeps the data/ CSV files current.
+
+    Writes only call mark_dirty(); the worker coalesces marks so each table
+    is dumped at most once per `interval`, `debounce` seconds after it first
+    became dirty.
+    """
+
+    def __init__(self, files, debounce=SNAPSHOT_DEBOUNCE, interval=SNAPSHOT_INTERVAL):
+        self.files = files
+        self.debounce = debounce
+        self.interval = interval
+        self._dirty = {}          # table -> wall time of the oldest unsaved change
+        self._last_dump = {}      # table -> monotonic time of the last dump attempt
+        self._last_success = {}   # table -> wall time of the last successful dump
+        self._last_error = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def mark_dirty(self, *tables):
+        with self._cond:
+            for table in tables:
+                if table in self.files:
+                    self._dirty.setdefault(table, time.time())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='csv-snapshots', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _due_at(self, table):
+        marked_age = time.time() - self._dirty[table]
+        since_dump = time.monotonic() - self._last_dump.get(table, float('-inf'))
+        return max(self.debounce - marked_age, self.interval - since_dump, 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+                waits = {t: self._due_at(t) for t in self._dirty}
+                due = [t for t, w in waits.items() if w <= 0]
+                if not due:
+                    self._cond.wait(min(waits.values()))
+                    continue
+                batch = {t: self._dirty.pop(t) for t in due}
+            for table, marked_at in batch.items():
+                self._dump(table, marked_at)
+
+    def _dump(self, table, marked_at):
+        self._last_dump[table] = time.monotonic()
+        try:
+            # every change logged before the SELECT starts is in the dump
+            seq = changelog.snapshot_seq()
+            dump_table_to_csv(table, self.files[table])
+            changelog.compact(table, seq, self.files[table])
+            self._last_success[table] = time.time()
+            self._last_error.pop(table, None)
+        except Exception as e:
+            # don't lose the change: retry on the next interval
+            self._last_error[table] = str(e)
+            with self._cond:
+                prev = self._dirty.get(table, marked_at)
+                self._dirty[table] = min(prev, marked_at)
+                self._cond.notify()
+
+    def dump(self, table):
+        """Dump one table now, in the calling thread; returns the error, if any."""
+        with self._cond:
+            marked_at = self._dirty.pop(table, time.time())
+        self._dump(table, marked_at)
+        return self._last_error.get(table)
+
+    def flush(self):
+        """Dump every dirty table now, in the calling thread."""
+        with self._cond:
+            batch = dict(self._dirty)
+            self._dirty.clear()
+        for table, marked_at in batch.items():
+            self._dump(table, marked_at)
+
+    def status(self):
+        now = time.time()
+        with self._cond:
+            dirty = dict(self._dirty)
+        tables = {}
+        for table, filename in self.files.items():
+            last_success = self._last_success.get(table)
+            tables[table] = {
+                'file': filename,
+                'dirty': table in dirty,
+                'lag_seconds': round(now - dirty[table], 3) if table in dirty else 0,
+                'last_success': datetime.fromtimestamp(last_success).isoformat() if last_success else None,
+                'last_error': self._last_error.get(table)
+            }
+        return {'tables': tables, 'max_lag_seconds': max(t['lag_seconds'] for t in tables.values())}
+
+
+snapshots = SnapshotWriter(SNAPSHOT_FILES)
+atexit.register(snapshots.flush)
+
+# ==================== CHANGE LOG ====================
+# Append-only NDJSON log per snapshot table. Each line is
+#   {"seq": 42, "op": "insert|update|delete", "pk": 7, "row": {...} | null, "ts": "..."}
+# with one sequence shared by all tables and by every process writing to DATA_DIR
+# (workers, CLI commands): appends hold an flock on changes.lock and take the
+# next seq from the files themselves. The manifest records, per table,
+# the sequence number its CSV snapshot already contains; consumers load the
+# CSV, then apply log entries with a larger seq (replaying one twice is harmless).
+CHANGELOG_FILES = {
+    'Books': 'books.changes.ndjson',
+    'Book_Copies': 'copies.changes.ndjson',
+    'Loans': 'loans.changes.ndjson',
+    'Members': 'members.changes.ndjson'
+}
+MANIFEST_FILE = 'snapshots.json'
+CHANGELOG_LOCK_FILE = 'changes.lock'
+
+def write_file_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ChangeLog:
+    """Per-table change logs plus the snapshot manifest under DATA_DIR.
+
+    Several processes may share DATA_DIR, so the sequence is not kept in memory: every
+    append, snapshot and compaction locks CHANGELOG_LOCK_FILE and re-reads the manifest
+    and the last line of each log first (the logs are appended in seq order).
+    """
+
+    def __init__(self, directory, files):
+        self.directory = directory
+        self.files = files
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+        self.seq = self._recover_seq()
+
+    def _path(self, table):
+        return os.path.join(self.directory, self.files[table])
+
+    @contextmanager
+    def _locked(self):
+        """Thread and process lock; refreshes self._manifest and self.seq on entry."""
+        with self._lock, open(os.path.join(self.directory, CHANGELOG_LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._manifest = self._load_manifest()
+            self.seq = self._recover_seq()
+            yield
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _last_seq(self, table, block=65536):
+        try:
+            with open(self._path(table), 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                while True:
+                    start = max(0, size - block)
+                    f.seek(start)
+                    lines = f.read().splitlines()
+                    if start > 0:
+                        lines = lines[1:]   # partial line
+                    lines = [line for line in lines if line.strip()]
+                    if lines:
+                        return json.loads(lines[-1])['seq']
+                    if start == 0:
+                        return 0
+                    block *= 4
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _recover_seq(self):
+        seq = max((m.get('seq', 0) for m in self._manifest.values()), default=0)
+        return max([seq, *(self._last_seq(table) for table in self.files)])
+
+    def record(self, conn, table, op, pks):
+        """Append one entry per primary key. Call after commit.
+
+        Row images are read under the log lock, so of two racing writers the
+        one that appends last also read the newer row.
+        """
+        if table not in self.files or not pks:
+            return
+        pk = TABLE_PKS[table]
+        try:
+            with self._locked():
+                rows = {}
+                if op != 'delete':
+                    cursor = conn.cursor(dictionary=True)
+                    for i in range(0, len(pks), 1000):
+                        chunk = pks[i:i + 1000]
+                        placeholders = ','.join(['%s'] * len(chunk))
+                        cursor.execute(f"SELECT * FROM {table} WHERE {pk} IN ({placeholders})", tuple(chunk))
+                        rows.update((r[pk], r) for r in cursor.fetchall())
+                    cursor.close()
+                    conn.rollback()
+                ts = datetime.now().isoformat()
+                lines = []
+                for key in pks:
+                    row = rows.get(key)
+                    self.seq += 1
+                    entry = {
+                        'seq': self.seq,
+                        # the row may already be gone again by the time we look
+                        'op': op if row is not None else 'delete',
+                        'pk': key,
+                        'row': {k: export_value(v) for k, v in row.items()} if row is not None else None,
+                        'ts': ts
+                    }
+                    lines.append(json.dumps(entry) + '\n')
+                with open(self._path(table), 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+        except Exception as e:
+            # the CSV snapshot still picks the change up; don't fail the request
+            self.last_error = str(e)
+
+    def snapshot_seq(self):
+        """Sequence number a snapshot started now is guaranteed to contain."""
+        with self._locked():
+            return self.seq
+
+    def compact(self, table, seq, filename):
+        """Record that `filename` holds every change up to `seq` and drop those entries from the log."""
+        with self._locked():
+            self._manifest[table] = {'file': filename, 'seq': seq, 'written_at': datetime.now().isoformat()}
+            write_file_atomic(os.path.join(self.directory, MANIFEST_FILE), json.dumps(self._manifest, indent=2))
+            if table not in self.files:
+                return
+            path = self._path(table)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    kept = [line for line in f if line.strip() and json.loads(line)['seq'] > seq]
+            except OSError:
+                return
+            write_file_atomic(path, ''.join(kept))
+
+    def status(self):
+        with self._locked():
+            return {'seq': self.seq, 'snapshots': dict(self._manifest), 'last_error': self.last_error}
+
+
+changelog = ChangeLog(DATA_DIR, CHANGELOG_FILES)
+
+# ==================== WRITE HOOKS ====================
+def missing_table(e):
+    """True for the 'table does not exist' error of either backend."""
+    if isinstance(e, mysql.connector.Error):
+        return e.errno == errorcode.ER_NO_SUCH_TABLE
+    return isinstance(e, sqlite3.OperationalError) and str(e).startswith('no such table')
+
+def bump_versions(cursor, *tables):
+    """Bump the ETag versions of `tables` in the caller's transaction; call it last, right before the
+    commit, so the version rows stay locked as briefly as possible.
+
+    Before migration 9 there is nothing to bump: the write goes ahead and responses stay untagged,
+    as table_versions.read() already answers then."""
+    tables = sorted(set(tables))
+    placeholders = ','.join(['%s'] * len(tables))
+    try:
+        cursor.execute(f"UPDATE Table_Versions SET version = version + 1 WHERE table_name IN ({placeholders})",
+                       tuple(tables))
+    except DB_ERRORS as e:
+        if not missing_table(e):
+            raise
+        app.logger.warning('Cannot bump table versions (run `flask migrate`): %s', e)
+
+def commit_changes(conn, *tables):
+    """Commit the open transaction together with a version bump of every table it wrote,
+    then run tables_changed."""
+    cursor = conn.cursor()
+    bump_versions(cursor, *tables)
+    cursor.close()
+    conn.commit()
+    tables_changed(*tables)
+
+def tables_changed(*tables):
+    """In-process hooks, called right after commit with every table a write touched. The
+    ETag versions are bumped in the transaction itself (bump_versions / commit_changes)."""
+    table_versions.invalidate()
+    if DASHBOARD_TABLES.intersection(tables):
+        dashboard_cache.invalidate()
+    snapshots.mark_dirty(*tables)
+
+def log_changes(conn, table, op, pks):
+    """Append committed row changes to the table's change log."""
+    changelog.record(conn, table, op, list(pks))
+
+# ==================== AVAILABILITY ====================
+# Copy_Availability (migration 4) holds copy counts per (isbn, branch_id). Every route that adds,
+# removes or changes the status of copies recounts the keys it touched from Book_Copies in its own
+# transaction, via the (isbn, branch_id, status) index; `flask rebuild-availability` repairs drift.
+AVAILABILITY_COUNTS_SQL = (
+    "SELECT isbn, branch_id, SUM(CASE WHEN status = 'Available' THEN 1 ELSE 0 END), "
+    "SUM(CASE WHEN status = 'On Loan' THEN 1 ELSE 0 END), SUM(CASE WHEN status = 'Reserved' THEN 1 ELSE 0 END) "
+    "FROM Book_Copies WHERE isbn IS NOT NULL AND branch_id IS NOT NULL{where} GROUP BY isbn, branch_id"
+)
+AVAILABILITY_INSERT = "INSERT INTO Copy_Availability (isbn, branch_id, available, on_loan, reserved) "
+AVAILABILITY_CHUNK = 500   # keys per recount statement
+
+def copy_keys(cursor, column, values):
+    """(isbn, branch_id) keys of the copies whose `column` is in `values`."""
+    values = list(values)
+    if not values:
+        return set()
+    placeholders = ','.join(['%s'] * len(values))
+    cursor.execute(f"SELECT DISTINCT isbn, branch_id FROM Book_Copies WHERE {column} IN ({placeholders})", tuple(values))
+    return set(cursor.fetchall())
+
+def refresh_availability(cursor, keys):
+    """Recount the given (isbn, branch_id) keys in the caller's transaction. Keys without
+    copies left lose their row."""
+    keys = sorted(k for k in set(keys) if None not in k)
+    for i in range(0, len(keys), AVAILABILITY_CHUNK):
+        chunk = keys[i:i + AVAILABILITY_CHUNK]
+        match = ' OR '.join(['(isbn = %s AND branch_id = %s)'] * len(chunk))
+        params = tuple(v for key in chunk for v in key)
+        cursor.execute(f"DELETE FROM Copy_Availability WHERE {match}", params)
+        cursor.execute(AVAILABILITY_INSERT + AVAILABILITY_COUNTS_SQL.format(where=f' AND ({match})'), params)
+
+def availability_drift(cursor):
+    """Keys whose stored counts differ from Book_Copies."""
+    cursor.execute("SELECT isbn, branch_id, available, on_loan, reserved FROM Copy_Availability")
+    stored = {(r[0], r[1]): tuple(r[2:]) for r in cursor.fetchall()}
+    cursor.execute(AVAILABILITY_COUNTS_SQL.format(where=''))
+    actual = {(r[0], r[1]): tuple(int(v) for v in r[2:]) for r in cursor.fetchall()}
+    return sorted(k for k in stored.keys() | actual.keys() if stored.get(k) != actual.get(k))
+
+def rebuild_availability(conn):
+    """Recount every key from Book_Copies in one transaction; returns the number of rows."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Copy_Availability")
+    cursor.execute(AVAILABILITY_INSERT + AVAILABILITY_COUNTS_SQL.format(where=''))
+    cursor.execute("SELECT COUNT(*) FROM Copy_Availability")
+    rows = cursor.fetchone()[0]
+    bump_versions(cursor, 'Copy_Availability')
+    conn.commit()
+    cursor.close()
+    return rows
+
+@app.cli.command('rebuild-availability')
+@click.option('--check', is_flag=True, help='Only report keys that drifted, change nothing.')
+def rebuild_availability_command(check):
+    """Reconcile Copy_Availability with Book_Copies."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        drift = availability_drift(cursor)
+        cursor.close()
+        click.echo(f'{len(drift)} (isbn, branch) keys out of date')
+        for isbn, branch_id in drift[:20]:
+            click.echo(f'    isbn {isbn}, branch {branch_id}')
+        if check:
+            if drift:
+                raise SystemExit(1)
+            return
+        click.echo(f'Rebuilt {rebuild_availability(conn)} rows')
+
+# ==================== JOBS ====================
+# Long operations run on a bounded pool of worker threads in this process. A route asked for
+# `?async=1` (or sent `Prefer: respond-async`) answers 202 with a job id instead of waiting;
+# clients poll GET /api/jobs/<id>. Job records live in the Jobs table (migration 7):
+#   status - queued, running, done, failed or cancelled
+#   progress / result - JSON written by the job; error - the message of a failed job
+# Jobs still queued or running when the server shuts down are marked failed.
+job_config = {
+    'workers': int(os.environ.get('LIBRARY_JOB_WORKERS', 2)),
+    'queue_size': 100   # jobs waiting for a worker; more are refused with 503
+}
+JOB_PROGRESS_INTERVAL = 1.0   # seconds between progress writes of one job
+JOB_LIST_LIMIT = 100
+JOB_KINDS = {}   # kind -> function(job, **params) returning the job's result
+
+
+class JobCancelled(Exception):
+    def __init__(self):
+        super().__init__('Job cancelled')
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def job_kind(name):
+    def register(fn):
+        JOB_KINDS[name] = fn
+        return fn
+    return register
+
+
+class Job:
+    """Handed to a running job function to report progress; progress() is also where cancellation lands."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.id = job_id
+        self._saved_at = 0.0
+
+    def progress(self, **values):
+        """Record the job's progress, at most every JOB_PROGRESS_INTERVAL seconds. Raises JobCancelled
+        once the job has been cancelled, so call it between units of work that may be left committed."""
+        if self.runner.cancel_seen(self.id):
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._saved_at >= JOB_PROGRESS_INTERVAL:
+            self._saved_at = now
+            if self.runner.save_progress(self.id, values):
+                raise JobCancelled()
+
+
+class JobRunner:
+    """Bounded pool of worker threads for queued jobs, started on the first submit."""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self._queue = queue.Queue(queue_size)
+        self._threads = []
+        self._active = set()      # ids of this process's queued and running jobs
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, **params):
+        job_id = os.urandom(8).hex()
+        now = datetime.now()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Jobs (job_id, kind, params, status, progress, result, error, cancel_requested, "
+                "created_at, started_at, finished_at, updated_at) "
+                "VALUES (%s, %s, %s, 'queued', NULL, NULL, NULL, 0, %s, NULL, NULL, %s)",
+                (job_id, kind, json.dumps(params, default=str), now, now)
+            )
+            conn.commit()
+            try:
+                self._queue.put_nowait((job_id, kind, params))
+            except queue.Full:
+                cursor.execute("DELETE FROM Jobs WHERE job_id = %s", (job_id,))
+                conn.commit()
+                raise JobQueueFull('Too many jobs waiting, try again later')
+            finally:
+                cursor.close()
+        with self._lock:
+            self._active.add(job_id)
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'jobs-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, kind, params = self._queue.get()
+            try:
+                self._run(job_id, kind, params)
+            finally:
+                with self._lock:
+                    self._active.discard(job_id)
+                    self._cancelled.discard(job_id)
+
+    def _update(self, sql, params):
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            changed = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        return changed
+
+    def _run(self, job_id, kind, params):
+        now = datetime.now()
+        claimed = self._update("UPDATE Jobs SET status = 'running', started_at = %s, updated_at = %s "
+                               "WHERE job_id = %s AND status = 'queued' AND cancel_requested = 0", (now, now, job_id))
+        if not claimed:
+            # cancelled while it was waiting
+            return
+        try:
+            result = JOB_KINDS[kind](Job(self, job_id), **params)
+            status, result, error = 'done', json.dumps(result, default=str), None
+        except JobCancelled:
+            status, result, error = 'cancelled', None, None
+        except Exception as e:
+            status, result, error = 'failed', None, str(e)
+        now = datetime.now()
+        self._update("UPDATE Jobs SET status = %s, result = %s, error = %s, finished_at = %s, updated_at = %s "
+                     "WHERE job_id = %s", (status, result, error, now, now, job_id))
+
+    def save_progress(self, job_id, values):
+        """Store a running job's progress; returns whether it has been cancelled meanwhile."""
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE Jobs SET progress = %s, updated_at = %s WHERE job_id = %s",
+                           (json.dumps(values, default=str), datetime.now(), job_id))
+            cursor.execute("SELECT cancel_requested FROM Jobs WHERE job_id = %s", (job_id,))
+            cancelled = cursor.fetchone()[0]
+            conn.commit()
+            cursor.close()
+        return bool(cancelled)
+
+    def cancel_seen(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    def cancel(self, job_id):
+        """Ask a queued or running job to stop; returns False if it had already finished.
+        A running job stops at its next progress report."""
+        now = datetime.now()
+        changed = self._update("UPDATE Jobs SET cancel_requested = 1, updated_at = %s "
+                               "WHERE job_id = %s AND status IN ('queued', 'running')", (now, job_id))
+        if changed:
+            self._update("UPDATE Jobs SET status = 'cancelled', finished_at = %s WHERE job_id = %s AND status = 'queued'",
+                         (now, job_id))
+            with self._lock:
+                self._cancelled.add(job_id)
+        return bool(changed)
+
+    def shutdown(self):
+        """Mark this process's unfinished jobs failed, so their records do not stay running forever."""
+        with self._lock:
+            active = list(self._active)
+        now = datetime.now()
+        for job_id in active:
+            try:
+                self._update("UPDATE Jobs SET status = 'failed', error = %s, finished_at = %s, updated_at = %s "
+                             "WHERE job_id = %s AND status IN ('queued', 'running')",
+                             ('Server stopped before the job finished', now, now, job_id))
+            except Exception:
+                pass
+
+
+jobs = JobRunner(job_config['workers'], job_config['queue_size'])
+atexit.register(jobs.shutdown)
+
+def job_record(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    for key in ('progress', 'result'):
+        job[key] = json.loads(job[key]) if job[key] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    for key in ('created_at', 'started_at', 'finished_at', 'updated_at'):
+        job[key] = str(job[key]) if job[key] is not None else None
+    return job
+
+def wants_job():
+    """Whether the client asked for a long operation to run as a job."""
+    return request.args.get('async') == '1' or 'respond-async' in request.headers.get('Prefer', '')
+
+def job_accepted(job_id, **extra):
+    """202 response pointing at the job."""
+    response = jsonify(dict(extra, job_id=job_id, status='queued', url=f'/api/jobs/{job_id}'))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job_id}'
+    return response
+
+def submit_job(kind, **params):
+    """jobs.submit with the queue-full case answered as 503."""
+    try:
+        return jobs.submit(kind, **params), None
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return None, response
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM Jobs ORDER BY created_at DESC LIMIT {JOB_LIST_LIMIT}")
+            rows = cursor.fetchall()
+            cursor.close()
+        return jsonify([job_record(r) for r in rows])
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM Jobs WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        if row is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job_record(row))
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    try:
+        if not jobs.cancel(job_id):
+            return jsonify({'error': 'Job not found or already finished'}), 404
+        return jsonify({'message': 'Cancellation requested', 'job_id': job_id})
+    except Exception as e:
+        return error_response(e)
+
+# ==================== HOME ====================
+@app.route('/')
+def home():
+    return render_template('library_management_frontend.html')
+
+# ==================== BOOKS ====================
+@app.route('/api/books', methods=['GET'])
+def get_books():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('books')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Books'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Books', 'isbn', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/books', methods=['POST'])
+def add_book():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Books (title, isbn, genre, publisher_id, publication_year) VALUES (%s, %s, %s, %s, %s)",
+                (data['title'], data.get('isbn', None), data['genre'], data['publisher_id'], data['publication_year'])
+            )
+            commit_changes(conn, 'Books')
+            log_changes(conn, 'Books', 'insert', [cursor.lastrowid])
+            cursor.close()
+        return jsonify({'message': 'Book added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Update a book
+@app.route('/api/books/<int:isbn>', methods=['PUT'])
+def update_book(isbn):
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE Books SET title=%s, publisher_id=%s, publication_year=%s, genre=%s WHERE isbn=%s",
+                (data.get('title'), data.get('publisher_id'), data.get('publication_year'), data.get('genre'), isbn)
+            )
+            commit_changes(conn, 'Books')
+            log_changes(conn, 'Books', 'update', [isbn])
+            cursor.close()
+        return jsonify({'message': 'Book updated', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Delete a book
+@app.route('/api/books/<int:isbn>', methods=['DELETE'])
+def delete_book(isbn):
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM Books WHERE isbn=%s", (isbn,))
+            commit_changes(conn, 'Books')
+            log_changes(conn, 'Books', 'delete', [isbn])
+            cursor.close()
+        return jsonify({'message': 'Book deleted', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+# Book detail: the book with its publisher, authors, copy counts per branch and open loans.
+# Built from four statements whatever the number of ISBNs, each an indexed lookup on isbn.
+BOOK_DETAIL_MAX = 500   # ISBNs per batched request
+BOOK_DETAIL_TABLES = ['Books', 'Publishers', 'Book_Authors', 'Authors', 'Book_Copies', 'Copy_Availability',
+                      'Library_Branches', 'Loans']
+
+def book_details(cursor, isbns):
+    """isbn -> detail dict for the ISBNs that exist; `cursor` returns dictionary rows."""
+    isbns = tuple(isbns)
+    placeholders = ','.join(['%s'] * len(isbns))
+    cursor.execute(
+        "SELECT b.isbn, b.title, b.publication_year, b.genre, b.publisher_id, p.name AS publisher_name, "
+        "p.address AS publisher_address, p.phone AS publisher_phone "
+        f"FROM Books b LEFT JOIN Publishers p ON p.publisher_id = b.publisher_id WHERE b.isbn IN ({placeholders})",
+        isbns
+    )
+    details = {}
+    for r in cursor.fetchall():
+        publisher = None
+        if r['publisher_name'] is not None:
+            publisher = {'publisher_id': r['publisher_id'], 'name': r['publisher_name'],
+                         'address': r['publisher_address'], 'phone': r['publisher_phone']}
+        details[r['isbn']] = {
+            'isbn': r['isbn'], 'title': r['title'], 'publication_year': r['publication_year'], 'genre': r['genre'],
+            'publisher_id': r['publisher_id'], 'publisher': publisher, 'authors': [],
+            'copies': {'available': 0, 'on_loan': 0, 'reserved': 0, 'branches': []}, 'open_loans': 0
+        }
+    if not details:
+        return details
+    isbns = tuple(details)
+    placeholders = ','.join(['%s'] * len(isbns))
+    cursor.execute(
+        "SELECT ba.isbn, a.author_id, a.first_name, a.last_name FROM Book_Authors ba "
+        f"JOIN Authors a ON a.author_id = ba.author_id WHERE ba.isbn IN ({placeholders}) ORDER BY ba.isbn, a.author_id",
+        isbns
+    )
+    for r in cursor.fetchall():
+        details[r.pop('isbn')]['authors'].append(r)
+    # per-branch counts come from the Copy_Availability table, kept current by every copy write
+    cursor.execute(
+        "SELECT ca.isbn, ca.branch_id, lb.name, lb.location, ca.available, ca.on_loan, ca.reserved FROM Copy_Availability ca "
+        f"JOIN Library_Branches lb ON lb.branch_id = ca.branch_id WHERE ca.isbn IN ({placeholders}) "
+        "ORDER BY ca.isbn, ca.branch_id",
+        isbns
+    )
+    for r in cursor.fetchall():
+        copies = details[r.pop('isbn')]['copies']
+        for key in ('available', 'on_loan', 'reserved'):
+            copies[key] += r[key]
+        copies['branches'].append(r)
+    cursor.execute(
+        "SELECT c.isbn, COUNT(*) AS open_loans FROM Book_Copies c JOIN Loans l ON l.copy_id = c.copy_id "
+        f"WHERE c.isbn IN ({placeholders}) AND l.return_date IS NULL GROUP BY c.isbn",
+        isbns
+    )
+    for r in cursor.fetchall():
+        details[r['isbn']]['open_loans'] = r['open_loans']
+    return details
+
+@app.route('/api/books/<int:isbn>/detail', methods=['GET'])
+def get_book_detail(isbn):
+    etag, not_modified = check_etag(BOOK_DETAIL_TABLES)
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            detail = book_details(cursor, [isbn]).get(isbn)
+            cursor.close()
+        if detail is None:
+            return jsonify({'error': 'Book not found'}), 404
+        return tag_response(jsonify(detail), etag)
+    except Exception as e:
+        return error_response(e)
+
+# Batched variant: ?isbns=1,2,3
+@app.route('/api/books/detail', methods=['GET'])
+def get_book_details():
+    try:
+        isbns = list(dict.fromkeys(int(v) for v in (request.args.get('isbns') or '').split(',') if v.strip()))
+    except ValueError:
+        return jsonify({'error': 'isbns must be a comma-separated list of integers'}), 400
+    if not isbns:
+        return jsonify({'error': 'No isbns provided'}), 400
+    if len(isbns) > BOOK_DETAIL_MAX:
+        return jsonify({'error': f'At most {BOOK_DETAIL_MAX} isbns per request'}), 400
+    etag, not_modified = check_etag(BOOK_DETAIL_TABLES)
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            details = book_details(cursor, isbns)
+            cursor.close()
+        return tag_response(jsonify({
+            'books': [details[isbn] for isbn in isbns if isbn in details],
+            'missing': [isbn for isbn in isbns if isbn not in details]
+        }), etag)
+    except Exception as e:
+        return error_response(e)
+
+# ==================== MEMBERS ====================
+@app.route('/api/members', methods=['GET'])
+def get_members():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('members')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Members'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Members', 'member_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/members', methods=['POST'])
+def add_member():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Members (first_name, last_name, email, address, phone, date_registered) VALUES (%s, %s, %s, %s, %s, CURDATE())",
+                (data['first_name'], data['last_name'], data['email'], data['address'], data['phone'])
+            )
+            commit_changes(conn, 'Members')
+            log_changes(conn, 'Members', 'insert', [cursor.lastrowid])
+            cursor.close()
+        return jsonify({'message': 'Member added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Update member
+@app.route('/api/members/<int:member_id>', methods=['PUT'])
+def update_member(member_id):
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE Members SET first_name=%s, last_name=%s, email=%s, address=%s, phone=%s WHERE member_id=%s",
+                (data.get('first_name'), data.get('last_name'), data.get('email'), data.get('address'), data.get('phone'), member_id)
+            )
+            commit_changes(conn, 'Members')
+            log_changes(conn, 'Members', 'update', [member_id])
+            cursor.close()
+        return jsonify({'message': 'Member updated', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Delete member
+@app.route('/api/members/<int:member_id>', methods=['DELETE'])
+def delete_member(member_id):
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM Members WHERE member_id=%s", (member_id,))
+            commit_changes(conn, 'Members')
+            log_changes(conn, 'Members', 'delete', [member_id])
+            cursor.close()
+        return jsonify({'message': 'Member deleted', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+# ==================== LOANS ====================
+@app.route('/api/loans', methods=['GET'])
+def get_loans():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('loans')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Loans'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Loans', 'loan_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+LOAN_DAYS = 14               # default loan period for checkouts without a due_date
+CHECKOUT_MAX_ITEMS = 1000    # (copy, member) pairs per checkout request
+
+def checkout_errors(cursor, items):
+    """Lock the copies of `items` ({copy_id, member_id} dicts) and check that each can be lent.
+    Returns (error message or None per item, {copy_id: (isbn, branch_id)}).
+
+    The copies are locked with SELECT ... FOR UPDATE in copy_id order, so two
+    checkouts of the same copy queue up instead of both seeing it Available, and
+    overlapping batches always lock in the same order and cannot deadlock.
+    """
+    copy_ids = sorted({item['copy_id'] for item in items})
+    placeholders = ','.join(['%s'] * len(copy_ids))
+    cursor.execute(
+        f"SELECT copy_id, status, isbn, branch_id FROM Book_Copies WHERE copy_id IN ({placeholders}) "
+        "ORDER BY copy_id FOR UPDATE",
+        tuple(copy_ids)
+    )
+    locked = cursor.fetchall()
+    status = {row[0]: row[1] for row in locked}
+    keys = {row[0]: (row[2], row[3]) for row in locked}
+    # a copy whose status says Available but still has an open loan is not lent twice either
+    cursor.execute(f"SELECT copy_id FROM Loans WHERE copy_id IN ({placeholders}) AND return_date IS NULL", tuple(copy_ids))
+    status.update((row[0], 'On Loan') for row in cursor.fetchall())
+    member_ids = sorted({item['member_id'] for item in items if item['member_id'] is not None})
+    members = set()
+    if member_ids:
+        placeholders = ','.join(['%s'] * len(member_ids))
+        cursor.execute(f"SELECT member_id FROM Members WHERE member_id IN ({placeholders})", tuple(member_ids))
+        members = {row[0] for row in cursor.fetchall()}
+
+    errors, taken = [], set()
+    for item in items:
+        copy_id = item['copy_id']
+        error = None
+        if copy_id not in status:
+            error = 'Copy not found'
+        elif copy_id in taken:
+            error = 'Copy appears more than once in this checkout'
+        elif status[copy_id] != 'Available':
+            error = f'Copy is {status[copy_id]}'
+        elif item['member_id'] not in members:
+            error = 'Member not found'
+        else:
+            taken.add(copy_id)
+        errors.append(error)
+    return errors, keys
+
+def checkout_copies(conn, items, issue_date, due_date):
+    """Lend the copies in `items` ({copy_id, member_id[, fine_amount]} dicts) inside the
+    caller's transaction. Returns (loans created, items rejected with a reason)."""
+    cursor = conn.cursor()
+    errors, keys = checkout_errors(cursor, items)
+    accepted = [item for item, error in zip(items, errors) if error is None]
+    rejected = [{'copy_id': item['copy_id'], 'member_id': item['member_id'], 'error': error}
+                for item, error in zip(items, errors) if error is not None]
+
+    loans = []
+    if accepted:
+        rows = [{'loan_id': None, 'copy_id': item['copy_id'], 'member_id': item['member_id'],
+                 'issue_date': issue_date, 'due_date': due_date, 'return_date': None,
+                 'fine_amount': item.get('fine_amount')} for item in accepted]
+        loan_ids = insert_rows(cursor, 'Loans', ENTITIES['loans']['columns'], rows)
+        lent = sorted(item['copy_id'] for item in accepted)
+        placeholders = ','.join(['%s'] * len(lent))
+        cursor.execute(f"UPDATE Book_Copies SET status='On Loan' WHERE copy_id IN ({placeholders})", tuple(lent))
+        refresh_availability(cursor, [keys[copy_id] for copy_id in lent])
+        loans = [{'loan_id': loan_id, 'copy_id': item['copy_id'], 'member_id': item['member_id']}
+                 for loan_id, item in zip(loan_ids, accepted)]
+    cursor.close()
+    return loans, rejected
+
+def checkout_args(data):
+    """Validate a checkout body -> (items, issue_date, due_date, all_or_nothing). Raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    raw = data.get('items')
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('items must be a non-empty list of {copy_id, member_id} objects')
+    if len(raw) > CHECKOUT_MAX_ITEMS:
+        raise ValueError(f'At most {CHECKOUT_MAX_ITEMS} items per checkout')
+    items = []
+    for number, item in enumerate(raw, start=1):
+        try:
+            items.append({'copy_id': int(item['copy_id']), 'member_id': int(item['member_id'])})
+        except (TypeError, KeyError, ValueError):
+            raise ValueError(f'items[{number}] needs integer copy_id and member_id')
+    issue_date = convert_value('date', data.get('issue_date') or _datetime.date.today())
+    if data.get('due_date'):
+        due_date = convert_value('date', data['due_date'])
+    else:
+        due_date = issue_date + _datetime.timedelta(days=LOAN_DAYS)
+    if due_date < issue_date:
+        raise ValueError('due_date is before issue_date')
+    return items, issue_date, due_date, bool(data.get('all_or_nothing'))
+
+@app.route('/api/loans', methods=['POST'])
+def add_loan():
+    data = request.get_json(silent=True) or {}
+    try:
+        copy_id, member_id = int(data['copy_id']), int(data['member_id'])
+    except (TypeError, KeyError, ValueError):
+        return jsonify({'error': 'copy_id and member_id must be integers'}), 400
+    try:
+        # Sanitize fine_amount from frontend.
+        fine_amount = data.get('fine_amount')
+        if fine_amount is None or fine_amount == '':
+            fine_amount = None
+        else:
+            # try to convert to float for DB insertion; if fails, treat as None
+            try:
+                fine_amount = float(fine_amount)
+            except Exception:
+                fine_amount = None
+        item = {'copy_id': copy_id, 'member_id': member_id, 'fine_amount': fine_amount}
+        with get_connection() as conn:
+            loans, rejected = checkout_copies(conn, [item], data['issue_date'], data['due_date'])
+            if rejected:
+                conn.rollback()
+                return jsonify({'error': rejected[0]['error']}), 409
+            commit_changes(conn, 'Loans', 'Book_Copies')
+            log_changes(conn, 'Loans', 'insert', [loans[0]['loan_id']])
+            log_changes(conn, 'Book_Copies', 'update', [copy_id])
+        return jsonify({'message': 'Loan created successfully', 'status': 'success', 'loan_id': loans[0]['loan_id']})
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/loans/checkout', methods=['POST'])
+def checkout():
+    """Lend many copies in one transaction. Unavailable copies are rejected, the rest
+    are lent; with all_or_nothing any rejection rolls the whole checkout back."""
+    try:
+        items, issue_date, due_date, all_or_nothing = checkout_args(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        with get_connection() as conn:
+            loans, rejected = checkout_copies(conn, items, issue_date, due_date)
+            if rejected and all_or_nothing:
+                conn.rollback()
+                return jsonify({'loans': [], 'rejected': rejected}), 409
+            if not loans:
+                conn.commit()
+            else:
+                commit_changes(conn, 'Loans', 'Book_Copies')
+                log_changes(conn, 'Loans', 'insert', [loan['loan_id'] for loan in loans])
+                log_changes(conn, 'Book_Copies', 'update', sorted(loan['copy_id'] for loan in loans))
+        return jsonify({'loans': loans, 'rejected': rejected,
+                        'issue_date': issue_date, 'due_date': due_date})
+    except Exception as e:
+        return error_response(e)
+
+
+# Update loan
+@app.route('/api/loans/<int:loan_id>', methods=['PUT'])
+def update_loan(loan_id):
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE Loans SET copy_id=%s, member_id=%s, issue_date=%s, due_date=%s, return_date=%s, fine_amount=%s WHERE loan_id=%s",
+                (data.get('copy_id'), data.get('member_id'), data.get('issue_date'), data.get('due_date'), data.get('return_date'), data.get('fine_amount'), loan_id)
+            )
+            # If return_date is provided, update copy status back to Available
+            if data.get('return_date'):
+                cursor.execute("UPDATE Book_Copies SET status=%s WHERE copy_id=%s", ('Available', data.get('copy_id')))
+                refresh_availability(cursor, copy_keys(cursor, 'copy_id', [data.get('copy_id')]))
+            commit_changes(conn, 'Loans', 'Book_Copies')
+            log_changes(conn, 'Loans', 'update', [loan_id])
+            if data.get('return_date'):
+                log_changes(conn, 'Book_Copies', 'update', [data.get('copy_id')])
+            cursor.close()
+        return jsonify({'message': 'Loan updated', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Delete loan
+@app.route('/api/loans/<int:loan_id>', methods=['DELETE'])
+def delete_loan(loan_id):
+    try:
+        # find loan to get copy_id
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT copy_id FROM Loans WHERE loan_id=%s", (loan_id,))
+            row = cursor.fetchone()
+            copy_id = row.get('copy_id') if row else None
+            cursor.close()
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM Loans WHERE loan_id=%s", (loan_id,))
+            # set copy to Available if it existed
+            if copy_id:
+                cursor.execute("UPDATE Book_Copies SET status=%s WHERE copy_id=%s", ('Available', copy_id))
+                refresh_availability(cursor, copy_keys(cursor, 'copy_id', [copy_id]))
+            commit_changes(conn, 'Loans', 'Book_Copies')
+            log_changes(conn, 'Loans', 'delete', [loan_id])
+            if copy_id:
+                log_changes(conn, 'Book_Copies', 'update', [copy_id])
+            cursor.close()
+        return jsonify({'message': 'Loan deleted', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+# ==================== FINES ====================
+# Overdue fines: daily_rate for every day past due_date, at most cap per loan
+# (LIBRARY_FINE_CAP=none for no cap)
+fine_config = {
+    'daily_rate': Decimal(os.environ.get('LIBRARY_FINE_RATE', '1.00')),
+    'cap': None if os.environ.get('LIBRARY_FINE_CAP') == 'none' else Decimal(os.environ.get('LIBRARY_FINE_CAP', '25.00'))
+}
+FINE_WINDOW_DAYS = 31   # due dates per transaction in assess_fines
+
+def accrued_fine(due_date, as_of):
+    """Fine an open loan due on `due_date` has accrued by `as_of`."""
+    fine = max((as_of - due_date).days, 0) * fine_config['daily_rate']
+    if fine_config['cap'] is not None:
+        fine = min(fine, fine_config['cap'])
+    return fine.quantize(Decimal('0.01'))
+
+def assess_fines(conn, as_of=None, log=True, progress=None):
+    """Write the accrued fine into fine_amount of every open loan that is past due on `as_of`.
+
+    The fine only depends on due_date, so it is computed here once per due date and
+    written with set-based UPDATEs over the (return_date, due_date) index: one per due
+    date still accruing, one per window for loans already at the cap. Windows of
+    FINE_WINDOW_DAYS commit separately, each followed by `progress(...)`. Loans whose
+    fine is already current are not touched, so a second run the same day writes nothing.
+    """
+    as_of = as_of or _datetime.date.today()
+    rate, cap = fine_config['daily_rate'], fine_config['cap']
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(due_date), COUNT(*) FROM Loans WHERE return_date IS NULL AND due_date < %s", (as_of,))
+    day, overdue = cursor.fetchone()
+    day = convert_value('date', day) if day is not None else as_of
+    # loans due before this day owe the full cap
+    capped_before = None
+    if cap is not None and rate > 0:
+        capped_before = as_of - _datetime.timedelta(days=math.ceil(cap / rate) - 1)
+    elif rate == 0:
+        capped_before = as_of
+    where = ("return_date IS NULL AND due_date >= %s AND due_date < %s "
+             "AND (fine_amount IS NULL OR fine_amount <> %s)")
+    updated = 0
+    while day < as_of:
+        end = min(day + _datetime.timedelta(days=FINE_WINDOW_DAYS), as_of)
+        if capped_before is not None and end <= capped_before:
+            ranges = [(day, end, accrued_fine(day, as_of))]
+        else:
+            ranges = [(d, d + _datetime.timedelta(days=1), accrued_fine(d, as_of))
+                      for d in (day + _datetime.timedelta(days=i) for i in range((end - day).days))]
+        loan_ids = []
+        window_updated = 0
+        for low, high, fine in ranges:
+            if log:
+                cursor.execute(f"SELECT loan_id FROM Loans WHERE {where}", (low, high, fine))
+                loan_ids.extend(r[0] for r in cursor.fetchall())
+            cursor.execute(f"UPDATE Loans SET fine_amount = %s WHERE {where}", (fine, low, high, fine))
+            updated += cursor.rowcount
+            window_updated += cursor.rowcount
+        if window_updated:
+            bump_versions(cursor, 'Loans')
+        conn.commit()
+        if log:
+            log_changes(conn, 'Loans', 'update', loan_ids)
+        day = end
+        if progress:
+            progress(as_of=as_of, overdue_loans=overdue, due_before=day, updated=updated)
+    cursor.close()
+    return {'as_of': as_of, 'overdue_loans': overdue, 'updated': updated, 'daily_rate': rate, 'cap': cap}
+
+def as_of_arg(value):
+    return _datetime.date.fromisoformat(value) if value else _datetime.date.today()
+
+@app.route('/api/fines/assess', methods=['POST'])
+def assess_fines_route():
+    """Run the fine job now; body {as_of?}. With ?async=1 it runs as a background job."""
+    body = request.get_json(silent=True) or {}
+    try:
+        as_of = as_of_arg(body.get('as_of'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        if wants_job():
+            job_id, refused = submit_job('assess_fines', as_of=as_of.isoformat())
+            return refused or job_accepted(job_id, as_of=as_of)
+        with get_connection() as conn:
+            try:
+                result = assess_fines(conn, as_of)
+            finally:
+                # windows commit as they go
+                tables_changed('Loans')
+        return jsonify(result)
+    except Exception as e:
+        return error_response(e)
+
+@job_kind('assess_fines')
+def assess_fines_job(job, as_of):
+    with get_connection() as conn:
+        try:
+            return assess_fines(conn, _datetime.date.fromisoformat(as_of), progress=job.progress)
+        finally:
+            tables_changed('Loans')
+
+JOB_POLL_INTERVAL = 2   # seconds between job polls of CLI commands that run on the server
+
+def run_server_job(url, body):
+    """POST `body` to a job route of a running server and wait for the job; returns its record."""
+    def call(method, target, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(target, data=data, method=method, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req) as response:
+            return response.headers, json.loads(response.read() or b'null')
+
+    headers, _ = call('POST', url, body)
+    job_url = urljoin(url, headers['Location'])
+    while True:
+        _, job = call('GET', job_url)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(JOB_POLL_INTERVAL)
+
+@app.cli.command('assess-fines')
+@click.option('--as-of', default=None, help='Date fines are computed for (YYYY-MM-DD, default today).')
+@click.option('--server', default=os.environ.get('LIBRARY_URL', 'http://localhost:5000'), show_default=True,
+              help='API server that runs the job (LIBRARY_URL).')
+@click.option('--local', is_flag=True,
+              help='Run in this process instead, e.g. while no server is running. The change logs miss the fines.')
+def assess_fines_command(as_of, server, local):
+    """Update fine_amount on every overdue open loan, e.g. nightly from cron.
+
+    By default the running server does the work, as a background job, so its change logs,
+    snapshots and caches see every updated loan; this command waits for the job to finish."""
+    try:
+        as_of = as_of_arg(as_of)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    started = time.monotonic()
+    if local:
+        # like `flask seed`, leaves the change logs alone; the snapshot dumped at exit carries the fines
+        with get_connection() as conn:
+            try:
+                result = assess_fines(conn, as_of, log=False)
+            finally:
+                tables_changed('Loans')
+    else:
+        try:
+            job = run_server_job(f"{server.rstrip('/')}/api/fines/assess?async=1", {'as_of': as_of.isoformat()})
+        except (OSError, ValueError) as e:
+            raise click.ClickException(f'Cannot run the fine job on {server}: {e} (use --local without a server)')
+        if job['status'] != 'done':
+            raise click.ClickException(f"Fine job {job['job_id']} {job['status']}: {job['error'] or ''}")
+        result = job['result']
+    click.echo(f"{result['overdue_loans']} overdue loans as of {as_of}, {result['updated']} fines updated "
+               f"in {time.monotonic() - started:.1f}s")
+
+@app.route('/api/loans/overdue', methods=['GET'])
+def overdue_report():
+    """Members with overdue open loans, a page of members at a time (?after=<member_id>&limit=N),
+    each with their overdue loans and the fines accrued by ?as_of= (default today)."""
+    try:
+        after, limit = page_args()
+        as_of = as_of_arg(request.args.get('as_of'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Loans', 'Members'], as_of)
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            # a page of members, grouped straight off the (return_date, member_id, due_date) index
+            cursor.execute(
+                "SELECT member_id FROM Loans WHERE return_date IS NULL AND due_date < %s AND member_id > %s "
+                "GROUP BY member_id ORDER BY member_id LIMIT %s",
+                (as_of, after if after is not None else 0, limit + 1)
+            )
+            member_ids = [r[0] for r in cursor.fetchall()]
+            next_cursor = None
+            if len(member_ids) > limit:
+                member_ids.pop()
+                next_cursor = member_ids[-1]
+            members, loans = {}, {}
+            if member_ids:
+                placeholders = ','.join(['%s'] * len(member_ids))
+                cursor.execute(f"SELECT member_id, first_name, last_name, email FROM Members "
+                               f"WHERE member_id IN ({placeholders})", tuple(member_ids))
+                members = {r[0]: r[1:] for r in cursor.fetchall()}
+                cursor.execute(
+                    f"SELECT member_id, loan_id, copy_id, due_date FROM Loans "
+                    f"WHERE return_date IS NULL AND due_date < %s AND member_id IN ({placeholders}) "
+                    f"ORDER BY member_id, due_date, loan_id",
+                    (as_of, *member_ids)
+                )
+                for member_id, loan_id, copy_id, due_date in cursor.fetchall():
+                    loans.setdefault(member_id, []).append(
+                        {'loan_id': loan_id, 'copy_id': copy_id, 'due_date': due_date,
+                         'days_overdue': (as_of - due_date).days, 'fine': accrued_fine(due_date, as_of)})
+            cursor.close()
+        columns = ['member_id', 'first_name', 'last_name', 'email', 'overdue_loans', 'oldest_due_date',
+                   'total_fines', 'loans']
+        rows = []
+        for member_id in member_ids:
+            member_loans = loans.get(member_id, [])
+            rows.append((member_id, *members.get(member_id, (None, None, None)), len(member_loans),
+                         member_loans[0]['due_date'] if member_loans else None,
+                         sum((l['fine'] for l in member_loans), Decimal('0.00')), member_loans))
+        return page_response(columns, rows, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+# ==================== BOOK COPIES ====================
+@app.route('/api/copies', methods=['GET'])
+def get_copies():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('copies')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Book_Copies'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Book_Copies', 'copy_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route('/api/copies', methods=['POST'])
+def add_copy():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Book_Copies (isbn, branch_id, status) VALUES (%s, %s, %s)",
+                (data.get('isbn'), data.get('branch_id'), data.get('status', 'Available'))
+            )
+            refresh_availability(cursor, [(data.get('isbn'), data.get('branch_id'))])
+            commit_changes(conn, 'Book_Copies')
+            log_changes(conn, 'Book_Copies', 'insert', [cursor.lastrowid])
+            cursor.close()
+        return jsonify({'message': 'Copy added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Edit a copy
+@app.route('/api/copies/<int:copy_id>', methods=['PUT'])
+def update_copy(copy_id):
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            # the copy may move to another title or branch: recount where it was and where it is
+            keys = copy_keys(cursor, 'copy_id', [copy_id])
+            cursor.execute(
+                "UPDATE Book_Copies SET isbn=%s, branch_id=%s, status=%s WHERE copy_id=%s",
+                (data.get('isbn'), data.get('branch_id'), data.get('status'), copy_id)
+            )
+            refresh_availability(cursor, keys | copy_keys(cursor, 'copy_id', [copy_id]))
+            commit_changes(conn, 'Book_Copies')
+            log_changes(conn, 'Book_Copies', 'update', [copy_id])
+            cursor.close()
+        return jsonify({'message': 'Copy updated', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# Delete a copy
+@app.route('/api/copies/<int:copy_id>', methods=['DELETE'])
+def delete_copy(copy_id):
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            keys = copy_keys(cursor, 'copy_id', [copy_id])
+            cursor.execute("DELETE FROM Book_Copies WHERE copy_id=%s", (copy_id,))
+            refresh_availability(cursor, keys)
+            commit_changes(conn, 'Book_Copies')
+            log_changes(conn, 'Book_Copies', 'delete', [copy_id])
+            cursor.close()
+        return jsonify({'message': 'Copy deleted', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+# Copies of a title per branch, from the precomputed counts
+@app.route('/api/books/<int:isbn>/availability', methods=['GET'])
+def get_availability(isbn):
+    branch_id = request.args.get('branch_id')
+    try:
+        branch_id = int(branch_id) if branch_id else None
+    except ValueError:
+        return jsonify({'error': 'branch_id must be an integer'}), 400
+    # Copy_Availability for `flask rebuild-availability`, which only rewrites the counts
+    etag, not_modified = check_etag(['Book_Copies', 'Copy_Availability'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            sql = "SELECT branch_id, available, on_loan, reserved FROM Copy_Availability WHERE isbn = %s"
+            params = [isbn]
+            if branch_id is not None:
+                sql += " AND branch_id = %s"
+                params.append(branch_id)
+            cursor.execute(sql + " ORDER BY branch_id", tuple(params))
+            branches = cursor.fetchall()
+            cursor.close()
+        totals = {k: sum(b[k] for b in branches) for k in ('available', 'on_loan', 'reserved')}
+        return tag_response(jsonify({'isbn': isbn, **totals, 'branches': branches}), etag)
+    except Exception as e:
+        return error_response(e)
+
+# ==================== BRANCHES ====================
+@app.route('/api/branches', methods=['GET'])
+def get_branches():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('branches')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Library_Branches'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Library_Branches', 'branch_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/branches', methods=['POST'])
+def add_branch():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Library_Branches (name, location) VALUES (%s, %s)",
+                (data['branch_name'], data['location'])
+            )
+            commit_changes(conn, 'Library_Branches')
+            cursor.close()
+        return jsonify({'message': 'Branch added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+# ==================== PUBLISHERS ====================
+@app.route('/api/publishers', methods=['GET'])
+def get_publishers():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('publishers')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Publishers'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Publishers', 'publisher_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/publishers', methods=['POST'])
+def add_publisher():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Publishers (name, address, phone) VALUES (%s, %s, %s)",
+                (data['publisher_name'], data['address'], data['phone'])
+            )
+            commit_changes(conn, 'Publishers')
+            cursor.close()
+        return jsonify({'message': 'Publisher added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# ==================== BULK DELETE ENDPOINTS ====================
+DELETE_CHUNK = 1000        # rows deleted per transaction
+DELETE_ROOT_CHUNK = 500    # requested ids cascaded per pass
+
+# Cascading bulk deletes: per entity, the tables emptied in order as
+#   (table, key column, FROM ... WHERE picking the rows that belong to a pass of requested ids {roots},
+#    [(table, column)] rows keyed by the deleted keys, deleted with them)
+# The last table is the entity itself. Each table is emptied DELETE_CHUNK rows per transaction, the rows
+# found through joins, and every transaction also checkpoints its run in Delete_Runs (migration 6).
+DELETE_CASCADES = {
+    'books': [
+        ('Loans', 'l.loan_id', "FROM Loans l JOIN Book_Copies c ON c.copy_id = l.copy_id WHERE c.isbn IN ({roots})", []),
+        ('Book_Copies', 'c.copy_id', "FROM Book_Copies c WHERE c.isbn IN ({roots})", []),
+        ('Books', 'b.isbn', "FROM Books b WHERE b.isbn IN ({roots})", [('Book_Authors', 'isbn')])
+    ],
+    'branches': [
+        ('Loans', 'l.loan_id',
+         "FROM Loans l JOIN Book_Copies c ON c.copy_id = l.copy_id WHERE c.branch_id IN ({roots})", []),
+        ('Book_Copies', 'c.copy_id', "FROM Book_Copies c WHERE c.branch_id IN ({roots})", []),
+        ('Library_Branches', 'r.branch_id', "FROM Library_Branches r WHERE r.branch_id IN ({roots})", [])
+    ],
+    'publishers': [
+        ('Loans', 'l.loan_id', "FROM Loans l JOIN Book_Copies c ON c.copy_id = l.copy_id "
+         "JOIN Books b ON b.isbn = c.isbn WHERE b.publisher_id IN ({roots})", []),
+        ('Book_Copies', 'c.copy_id',
+         "FROM Book_Copies c JOIN Books b ON b.isbn = c.isbn WHERE b.publisher_id IN ({roots})", []),
+        ('Books', 'b.isbn', "FROM Books b WHERE b.publisher_id IN ({roots})", [('Book_Authors', 'isbn')]),
+        ('Publishers', 'p.publisher_id', "FROM Publishers p WHERE p.publisher_id IN ({roots})", [])
+    ]
+}
+
+def cascade_counts(cursor, entity, ids):
+    """Rows a cascading delete of `ids` would remove, per table."""
+    counts = {}
+    for i in range(0, len(ids), DELETE_ROOT_CHUNK):
+        roots = tuple(ids[i:i + DELETE_ROOT_CHUNK])
+        placeholders = ','.join(['%s'] * len(roots))
+        for table, key, source, linked in DELETE_CASCADES[entity]:
+            source = source.format(roots=placeholders)
+            for linked_table, column in linked:
+                cursor.execute(f"SELECT COUNT(*) FROM {linked_table} WHERE {column} IN (SELECT {key} {source})", roots)
+                counts[linked_table] = counts.get(linked_table, 0) + cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) {source}", roots)
+            counts[table] = counts.get(table, 0) + cursor.fetchone()[0]
+    return counts
+
+def start_delete_run(conn, entity, ids):
+    run_id = os.urandom(8).hex()
+    now = datetime.now()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO Delete_Runs (run_id, entity, ids, done, counts, status, error, created_at, updated_at) "
+        "VALUES (%s, %s, %s, 0, %s, 'running', NULL, %s, %s)",
+        (run_id, entity, json.dumps(ids), '{}', now, now)
+    )
+    conn.commit()
+    cursor.close()
+    return run_id
+
+def delete_run(conn, run_id):
+    """The Delete_Runs entry as a dict, or None."""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM Delete_Runs WHERE run_id = %s", (run_id,))
+    run = cursor.fetchone()
+    conn.rollback()
+    cursor.close()
+    if run is None:
+        return None
+    ids = json.loads(run.pop('ids'))
+    run.update(requested=len(ids), counts=json.loads(run['counts']),
+               created_at=str(run['created_at']), updated_at=str(run['updated_at']))
+    return run
+
+def delete_chunk(conn, run_id, step, roots):
+    """Delete up to DELETE_CHUNK rows of one cascade step in one transaction; returns how many."""
+    table, key, source, linked = step
+    placeholders = ','.join(['%s'] * len(roots))
+    cursor = conn.cursor()
+    # the run row first: concurrent resumes of one run take turns
+    cursor.execute("SELECT counts FROM Delete_Runs WHERE run_id = %s FOR UPDATE", (run_id,))
+    counts = json.loads(cursor.fetchone()[0])
+    cursor.execute(f"SELECT {key} {source.format(roots=placeholders)} ORDER BY {key} LIMIT %s FOR UPDATE",
+                   (*roots, DELETE_CHUNK))
+    keys = [r[0] for r in cursor.fetchall()]
+    if not keys:
+        conn.rollback()
+        cursor.close()
+        return 0
+    placeholders = ','.join(['%s'] * len(keys))
+    for linked_table, column in linked:
+        cursor.execute(f"DELETE FROM {linked_table} WHERE {column} IN ({placeholders})", tuple(keys))
+        counts[linked_table] = counts.get(linked_table, 0) + cursor.rowcount
+    availability = copy_keys(cursor, 'copy_id', keys) if table == 'Book_Copies' else None
+    cursor.execute(f"DELETE FROM {table} WHERE {key.split('.')[1]} IN ({placeholders})", tuple(keys))
+    counts[table] = counts.get(table, 0) + cursor.rowcount
+    if availability:
+        refresh_availability(cursor, availability)
+    cursor.execute("UPDATE Delete_Runs SET counts = %s, updated_at = %s WHERE run_id = %s",
+                   (json.dumps(counts), datetime.now(), run_id))
+    commit_changes(conn, table, *(t for t, _ in linked))
+    log_changes(conn, table, 'delete', keys)
+    cursor.close()
+    return len(keys)
+
+def run_delete(conn, run_id, progress=None):
+    """Carry a delete run on from its checkpoint to the end. Every step is repeatable, so a pass
+    cut short is simply run again; `done` counts the requested ids whose pass completed.
+    `progress(...)` is called after every chunk."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT entity, ids, done FROM Delete_Runs WHERE run_id = %s", (run_id,))
+    entity, ids, done = cursor.fetchone()
+    conn.rollback()
+    ids = json.loads(ids)
+    deleted = 0
+    try:
+        while done < len(ids):
+            roots = ids[done:done + DELETE_ROOT_CHUNK]
+            for step in DELETE_CASCADES[entity]:
+                while True:
+                    chunk = delete_chunk(conn, run_id, step, roots)
+                    if not chunk:
+                        break
+                    deleted += chunk
+                    if progress:
+                        progress(requested=len(ids), done=done, table=step[0], rows_deleted=deleted)
+            done += len(roots)
+            cursor.execute("UPDATE Delete_Runs SET done = %s, status = %s, error = NULL, updated_at = %s "
+                           "WHERE run_id = %s", (done, 'running' if done < len(ids) else 'done', datetime.now(), run_id))
+            conn.commit()
+        if not ids:
+            cursor.execute("UPDATE Delete_Runs SET status = 'done', updated_at = %s WHERE run_id = %s",
+                           (datetime.now(), run_id))
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        cursor.execute("UPDATE Delete_Runs SET error = %s, updated_at = %s WHERE run_id = %s",
+                       (str(e), datetime.now(), run_id))
+        conn.commit()
+        raise
+    finally:
+        cursor.close()
+    return delete_run(conn, run_id)
+
+def strict_int(value):
+    """int() of an integer or a string of digits; floats and booleans are refused rather than truncated."""
+    if isinstance(value, (bool, float)):
+        raise ValueError(value)
+    return int(value)
+
+def bulk_ids(data):
+    """The de-duplicated integer ids of a bulk delete body; ValueError with the message for a 400.
+    Checked before any SQL runs, so a bad id cannot fail a delete halfway through."""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    ids = data.get('ids') or []
+    try:
+        if not isinstance(ids, list):
+            raise TypeError
+        return list(dict.fromkeys(strict_int(i) for i in ids))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be a list of integers') from None
+
+def cascade_delete(entity):
+    """Body: {ids: [...]} to start a delete, {ids, dry_run: true} for the cascade counts only,
+    or {resume: run_id} to finish an interrupted run."""
+    data = request.get_json(silent=True)
+    try:
+        ids = bulk_ids(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    resume = data.get('resume')
+    if not ids and not resume:
+        return jsonify({'error': 'No ids provided'}), 400
+    run_id = None
+    try:
+        with get_connection() as conn:
+            if data.get('dry_run'):
+                cursor = conn.cursor()
+                counts = cascade_counts(cursor, entity, ids)
+                conn.rollback()
+                cursor.close()
+                return jsonify({'dry_run': True, 'requested': len(ids), 'counts': counts})
+            if resume:
+                run = delete_run(conn, resume)
+                if run is None or run['entity'] != entity:
+                    return jsonify({'error': 'Delete run not found'}), 404
+                run_id = resume
+            else:
+                run_id = start_delete_run(conn, entity, ids)
+            if wants_job():
+                job_id, refused = submit_job('bulk_delete', run_id=run_id)
+                if refused and not resume:
+                    discard_delete_run(conn, run_id)
+                return refused or job_accepted(job_id, run_id=run_id)
+            run = run_delete(conn, run_id)
+        table = DELETE_CASCADES[entity][-1][0]
+        return jsonify(dict(run, deleted=run['counts'].get(table, 0)))
+    except Exception as e:
+        record_error(e)
+        # rows deleted so far stay deleted; {resume: run_id} carries on from the last checkpoint
+        return jsonify({'error': str(e), 'run_id': run_id}), 500
+
+def discard_delete_run(conn, run_id):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Delete_Runs WHERE run_id = %s AND done = 0", (run_id,))
+    conn.commit()
+    cursor.close()
+
+@job_kind('bulk_delete')
+def bulk_delete_job(job, run_id):
+    with get_connection() as conn:
+        return run_delete(conn, run_id, job.progress)
+
+@app.route('/api/delete-runs/<run_id>', methods=['GET'])
+def get_delete_run(run_id):
+    try:
+        with get_connection() as conn:
+            run = delete_run(conn, run_id)
+        if run is None:
+            return jsonify({'error': 'Delete run not found'}), 404
+        return jsonify(run)
+    except Exception as e:
+        return error_response(e)
+
+@app.cli.command('resume-deletes')
+def resume_deletes_command():
+    """Finish every bulk delete run that was interrupted."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT run_id FROM Delete_Runs WHERE status = 'running' ORDER BY created_at")
+        run_ids = [r[0] for r in cursor.fetchall()]
+        conn.rollback()
+        cursor.close()
+        for run_id in run_ids:
+            run = run_delete(conn, run_id)
+            click.echo(f"{run_id} {run['entity']}: {json.dumps(run['counts'])}")
+    if not run_ids:
+        click.echo('No interrupted delete runs')
+
+@app.route('/api/books/bulk_delete', methods=['POST'])
+def bulk_delete_books():
+    return cascade_delete('books')
+
+
+@app.route('/api/members/bulk_delete', methods=['POST'])
+def bulk_delete_members():
+    try:
+        ids = bulk_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ids:
+        return jsonify({'error': 'No ids provided'}), 400
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['%s'] * len(ids))
+            # delete dependent loans first
+            cursor.execute(f"SELECT loan_id FROM Loans WHERE member_id IN ({placeholders})", tuple(ids))
+            loan_ids = [r[0] for r in cursor.fetchall()]
+            cursor.execute(f"DELETE FROM Loans WHERE member_id IN ({placeholders})", tuple(ids))
+            cursor.execute(f"DELETE FROM Members WHERE member_id IN ({placeholders})", tuple(ids))
+            commit_changes(conn, 'Loans', 'Members')
+            log_changes(conn, 'Loans', 'delete', loan_ids)
+            log_changes(conn, 'Members', 'delete', ids)
+            cursor.close()
+        return jsonify({'deleted': len(ids)})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route('/api/loans/bulk_delete', methods=['POST'])
+def bulk_delete_loans():
+    try:
+        ids = bulk_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ids:
+        return jsonify({'error': 'No ids provided'}), 400
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            # collect copy_ids for loans to set copies available
+            placeholders = ','.join(['%s'] * len(ids))
+            cursor.execute(f"SELECT copy_id FROM Loans WHERE loan_id IN ({placeholders})", tuple(ids))
+            rows = cursor.fetchall()
+            copy_ids = [r[0] for r in rows if r]
+            # delete loans
+            cursor.execute(f"DELETE FROM Loans WHERE loan_id IN ({placeholders})", tuple(ids))
+            if copy_ids:
+                ph = ','.join(['%s'] * len(copy_ids))
+                # set copies to Available
+                cursor.execute(f"UPDATE Book_Copies SET status=%s WHERE copy_id IN ({ph})", tuple(['Available'] + copy_ids))
+                refresh_availability(cursor, copy_keys(cursor, 'copy_id', copy_ids))
+            commit_changes(conn, 'Loans', 'Book_Copies')
+            log_changes(conn, 'Loans', 'delete', ids)
+            log_changes(conn, 'Book_Copies', 'update', copy_ids)
+            cursor.close()
+        return jsonify({'deleted': len(ids)})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route('/api/copies/bulk_delete', methods=['POST'])
+def bulk_delete_copies():
+    try:
+        ids = bulk_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ids:
+        return jsonify({'error': 'No ids provided'}), 400
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['%s'] * len(ids))
+            # delete loans referencing these copies first
+            cursor.execute(f"SELECT loan_id FROM Loans WHERE copy_id IN ({placeholders})", tuple(ids))
+            loan_ids = [r[0] for r in cursor.fetchall()]
+            keys = copy_keys(cursor, 'copy_id', ids)
+            cursor.execute(f"DELETE FROM Loans WHERE copy_id IN ({placeholders})", tuple(ids))
+            cursor.execute(f"DELETE FROM Book_Copies WHERE copy_id IN ({placeholders})", tuple(ids))
+            refresh_availability(cursor, keys)
+            commit_changes(conn, 'Loans', 'Book_Copies')
+            log_changes(conn, 'Loans', 'delete', loan_ids)
+            log_changes(conn, 'Book_Copies', 'delete', ids)
+            cursor.close()
+        return jsonify({'deleted': len(ids)})
+    except Exception as e:
+        return error_response(e)
+
+
+@app.route('/api/branches/bulk_delete', methods=['POST'])
+def bulk_delete_branches():
+    return cascade_delete('branches')
+
+
+@app.route('/api/publishers/bulk_delete', methods=['POST'])
+def bulk_delete_publishers():
+    return cascade_delete('publishers')
+
+
+@app.route('/api/authors/bulk_delete', methods=['POST'])
+def bulk_delete_authors():
+    try:
+        ids = bulk_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ids:
+        return jsonify({'error': 'No ids provided'}), 400
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['%s'] * len(ids))
+            # delete book_author links first
+            cursor.execute(f"DELETE FROM Book_Authors WHERE author_id IN ({placeholders})", tuple(ids))
+            cursor.execute(f"DELETE FROM Authors WHERE author_id IN ({placeholders})", tuple(ids))
+            commit_changes(conn, 'Book_Authors', 'Authors')
+            cursor.close()
+        return jsonify({'deleted': len(ids)})
+    except Exception as e:
+        return error_response(e)
+
+# ==================== BULK IMPORT ====================
+BULK_BATCH_SIZE = 500     # rows per executemany / transaction
+BULK_MAX_ERRORS = 1000    # per-row errors echoed back in the response
+COPY_STATUSES = ('Available', 'On Loan', 'Reserved')
+
+# Same column layout as the data/ CSV files; the primary key may be left empty
+IMPORT_SCHEMAS = {
+    'books': {
+        'required': ['title'],
+        'types': {'isbn': 'int', 'publisher_id': 'int', 'publication_year': 'int'}
+    },
+    'members': {
+        'required': ['first_name', 'last_name'],
+        'types': {'member_id': 'int', 'date_registered': 'date'}
+    },
+    'copies': {
+        'required': ['isbn', 'branch_id'],
+        'types': {'copy_id': 'int', 'isbn': 'int', 'branch_id': 'int', 'status': 'status'}
+    },
+    'loans': {
+        'required': ['copy_id', 'member_id', 'issue_date', 'due_date'],
+        'types': {'loan_id': 'int', 'copy_id': 'int', 'member_id': 'int', 'issue_date': 'date',
+                  'due_date': 'date', 'return_date': 'date', 'fine_amount': 'decimal'}
+    }
+}
+
+def convert_value(kind, value):
+    if kind == 'int':
+        return int(value)
+    if kind == 'date':
+        return value if isinstance(value, _datetime.date) else _datetime.date.fromisoformat(str(value))
+    if kind == 'decimal':
+        return Decimal(str(value))
+    if kind == 'status':
+        if value not in COPY_STATUSES:
+            raise ValueError(f"status must be one of: {', '.join(COPY_STATUSES)}")
+    return value
+
+def clean_import_row(entity, raw):
+    """Validate one incoming row and return a dict with every column of the entity.
+    Raises ValueError describing the first problem found."""
+    meta = ENTITIES[entity]
+    schema = IMPORT_SCHEMAS[entity]
+    if not isinstance(raw, dict):
+        raise ValueError('row must be an object')
+    unknown = [k for k in raw if k not in meta['columns']]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}")
+    row = {}
+    for col in meta['columns']:
+        value = raw.get(col)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            value = None
+        if value is None and col in schema['required']:
+            raise ValueError(f'{col} is required')
+        if value is not None and col in schema['types']:
+            try:
+                value = convert_value(schema['types'][col], value)
+            except (ValueError, ArithmeticError) as e:
+                raise ValueError(f'{col}: {e}')
+        row[col] = value
+    if entity == 'members' and row['date_registered'] is None:
+        row['date_registered'] = _datetime.date.today()
+    if entity == 'copies' and row['status'] is None:
+        row['status'] = 'Available'
+    return row
+
+def insert_rows(cursor, table, columns, rows):
+    """One multi-row INSERT via executemany; returns the primary keys of the new rows.
+
+    Callers pass rows that either all carry their primary key or all leave it
+    to AUTO_INCREMENT, so a batch never becomes a mixed-mode insert and the
+    generated keys are consecutive from lastrowid.
+    """
+    pk = columns[0]
+    explicit = rows[0][pk] is not None
+    cols = columns if explicit else columns[1:]
+    placeholders = ', '.join(['%s'] * len(cols))
+    cursor.executemany(
+        f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders})",
+        [tuple(r[c] for c in cols) for r in rows]
+    )
+    if explicit:
+        return [r[pk] for r in rows]
+    return list(range(cursor.lastrowid, cursor.lastrowid + len(rows)))
+
+def import_batch(conn, entity, batch, result):
+    """Insert one batch in its own transaction. `batch` is a list of (row_number, row).
+
+    If the multi-row insert fails the batch is retried row by row so a single
+    bad row only costs itself.
+    """
+    meta = ENTITIES[entity]
+    table, pk, columns = meta['table'], meta['pk'], meta['columns']
+    cursor = conn.cursor()
+    inserted = []   # (row, pk) pairs that made it in
+    for group in ([r for r in batch if r[1][pk] is not None], [r for r in batch if r[1][pk] is None]):
+        if entity == 'loans':
+            group = claim_loan_copies(cursor, group, result)
+        if not group:
+            continue
+        rows = [r for _, r in group]
+        try:
+            ids = insert_rows(cursor, table, columns, rows)
+            inserted.extend(zip(rows, ids))
+        except DB_ERRORS:
+            # find the offending rows; a failed statement does not abort the transaction
+            for number, row in group:
+                try:
+                    ids = insert_rows(cursor, table, columns, [row])
+                    inserted.append((row, ids[0]))
+                except DB_ERRORS as e:
+                    add_import_error(result, number, str(e))
+    changed = [table]
+    on_loan = []
+    if entity == 'copies':
+        refresh_availability(cursor, [(row['isbn'], row['branch_id']) for row, _ in inserted])
+    if entity == 'loans':
+        # copies of open loans go out on loan, in one set-based update; claim_loan_copies holds their locks
+        on_loan = sorted({row['copy_id'] for row, _ in inserted if row['return_date'] is None})
+        if on_loan:
+            placeholders = ','.join(['%s'] * len(on_loan))
+            cursor.execute(f"UPDATE Book_Copies SET status='On Loan' WHERE copy_id IN ({placeholders})", tuple(on_loan))
+            refresh_availability(cursor, copy_keys(cursor, 'copy_id', on_loan))
+            changed.append('Book_Copies')
+    if inserted:
+        bump_versions(cursor, *changed)
+    conn.commit()
+    cursor.close()
+    result['inserted'] += len(inserted)
+    if inserted:
+        tables_changed(*changed)
+        log_changes(conn, table, 'insert', [i for _, i in inserted])
+        log_changes(conn, 'Book_Copies', 'update', on_loan)
+
+def claim_loan_copies(cursor, group, result):
+    """Open loans of an import group go through the lock-and-check of checkouts, so a copy that is
+    not Available (or appears twice) is refused instead of lent twice. Returns the rows to insert."""
+    claims = [(number, row) for number, row in group if row['return_date'] is None and row['copy_id'] is not None]
+    if not claims:
+        return group
+    errors, _ = checkout_errors(cursor, [row for _, row in claims])
+    refused = set()
+    for (number, _), error in zip(claims, errors):
+        if error is not None:
+            add_import_error(result, number, error)
+            refused.add(number)
+    return [r for r in group if r[0] not in refused]
+
+def add_import_error(result, row_number, message):
+    result['failed'] += 1
+    if len(result['errors']) < BULK_MAX_ERRORS:
+        result['errors'].append({'row': row_number, 'error': message})
+    else:
+        result['errors_truncated'] = True
+
+def import_source(entity):
+    """Rows from the request: a JSON array, an uploaded CSV file ('file') or a text/csv body.
+    Returns an iterator of raw dicts; raises ValueError when the payload is unusable."""
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    elif request.mimetype == 'text/csv':
+        stream = io.StringIO(request.get_data(as_text=True), newline='')
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array of rows or a CSV upload')
+        return iter(data)
+    reader = csv.DictReader(stream)
+    unknown = [c for c in (reader.fieldnames or []) if c not in ENTITIES[entity]['columns']]
+    if unknown:
+        raise ValueError(f"Unknown CSV columns: {', '.join(unknown)}")
+    return reader
+
+@app.route('/api/<entity>/bulk', methods=['POST'])
+def bulk_import(entity):
+    if entity not in IMPORT_SCHEMAS:
+        return jsonify({'error': f'Bulk import is not supported for {entity}'}), 404
+    try:
+        source = import_source(entity)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = {'inserted': 0, 'failed': 0, 'errors': []}
+    try:
+        with get_connection() as conn:
+            batch = []
+            for number, raw in enumerate(source, start=1):
+                try:
+                    batch.append((number, clean_import_row(entity, raw)))
+                except ValueError as e:
+                    add_import_error(result, number, str(e))
+                    continue
+                if len(batch) >= BULK_BATCH_SIZE:
+                    import_batch(conn, entity, batch, result)
+                    batch = []
+            if batch:
+                import_batch(conn, entity, batch, result)
+        return jsonify(result)
+    except Exception as e:
+        # batches committed before the failure stay in
+        record_error(e)
+        result['error'] = str(e)
+        return jsonify(result), 500
+
+# ==================== AUTHORS ====================
+@app.route('/api/authors', methods=['GET'])
+def get_authors():
+    try:
+        after, limit = page_args()
+        fields, filters = list_args('authors')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag, not_modified = check_etag(['Authors'])
+    if not_modified:
+        return not_modified
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            columns, data, next_cursor = fetch_page(cursor, 'Authors', 'author_id', after, limit, fields, filters)
+            cursor.close()
+        return page_response(columns, data, next_cursor, etag)
+    except Exception as e:
+        return error_response(e)
+
+@app.route('/api/authors', methods=['POST'])
+def add_author():
+    try:
+        data = request.json
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Authors (first_name, last_name) VALUES (%s, %s)",
+                (data['first_name'], data['last_name'])
+            )
+            commit_changes(conn, 'Authors')
+            cursor.close()
+        return jsonify({'message': 'Author added successfully', 'status': 'success'})
+    except Exception as e:
+        return error_response(e)
+
+
+# ==================== SEARCH ====================
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+SEARCH_TYPES = ('books', 'members', 'copies')
+# innodb_ft_min_token_size default; shorter words are matched through B-tree prefix indexes
+FULLTEXT_MIN_TOKEN = 3
+MAX_INT = 2147483647
+
+def search_words(q):
+    return re.findall(r'\w+', q)
+
+def fulltext_query(words):
+    """Boolean-mode query requiring every word as a prefix: ['harry', 'pot'] -> '+harry* +pot*'."""
+    return ' '.join(f'+{w}*' for w in words)
+
+def like_prefix(q):
+    return q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def word_match_clause(columns, words):
+    """Stand-in for MATCH ... AGAINST on backends without FULLTEXT: every word must occur in one of the columns."""
+    clauses, params = [], []
+    for w in words:
+        clauses.append('(' + ' OR '.join(f'{c} LIKE %s' for c in columns) + ')')
+        params += ['%' + like_prefix(w)] * len(columns)
+    return ' AND '.join(clauses), params
+
+def isbn_prefix_ranges(digits):
+    """ISBNs are INTs, so a digit prefix becomes a handful of primary-key ranges:
+    '12' -> (12, 12), (120, 129), (1200, 1299), ... up to the INT maximum."""
+    if digits.startswith('0'):
+        return [(0, 0)] if int(digits) == 0 else []
+    lo = hi = int(digits)
+    ranges = []
+    while lo <= MAX_INT:
+        ranges.append((lo, min(hi, MAX_INT)))
+        lo, hi = lo * 10, hi * 10 + 9
+    return ranges
+
+def isbn_prefix_clause(column, digits):
+    ranges = isbn_prefix_ranges(digits)
+    if not ranges:
+        return '1 = 0', []
+    clause = ' OR '.join(f'{column} BETWEEN %s AND %s' for _ in ranges)
+    return f'({clause})', [v for r in ranges for v in r]
+
+def search_books(cursor, q, limit):
+    words = search_words(q)
+    if q.isdigit():
+        where, params = isbn_prefix_clause('isbn', q)
+        cursor.execute(f"SELECT *, 1 AS score FROM Books WHERE {where} ORDER BY isbn LIMIT %s", (*params, limit))
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN and not backend.fulltext:
+        where, params = word_match_clause(['title'], words)
+        cursor.execute(f"SELECT *, 1 AS score FROM Books WHERE {where} ORDER BY title LIMIT %s", (*params, limit))
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN:
+        ft = fulltext_query(words)
+        cursor.execute(
+            "SELECT *, MATCH(title) AGAINST(%s IN BOOLEAN MODE) AS score FROM Books "
+            "WHERE MATCH(title) AGAINST(%s IN BOOLEAN MODE) ORDER BY score DESC, isbn LIMIT %s",
+            (ft, ft, limit)
+        )
+    else:
+        cursor.execute("SELECT *, 1 AS score FROM Books WHERE title LIKE %s ORDER BY title LIMIT %s", (like_prefix(q), limit))
+    return cursor.fetchall()
+
+def search_members(cursor, q, limit):
+    words = search_words(q)
+    if '@' in q:
+        cursor.execute("SELECT *, 1 AS score FROM Members WHERE email LIKE %s ORDER BY email LIMIT %s", (like_prefix(q), limit))
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN and not backend.fulltext:
+        where, params = word_match_clause(['first_name', 'last_name', 'email'], words)
+        cursor.execute(
+            f"SELECT *, 1 AS score FROM Members WHERE {where} ORDER BY last_name, first_name LIMIT %s",
+            (*params, limit)
+        )
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN:
+        ft = fulltext_query(words)
+        cursor.execute(
+            "SELECT *, MATCH(first_name, last_name, email) AGAINST(%s IN BOOLEAN MODE) AS score FROM Members "
+            "WHERE MATCH(first_name, last_name, email) AGAINST(%s IN BOOLEAN MODE) ORDER BY score DESC, member_id LIMIT %s",
+            (ft, ft, limit)
+        )
+    else:
+        prefix = like_prefix(q)
+        cursor.execute(
+            "SELECT *, 1 AS score FROM Members WHERE first_name LIKE %s OR last_name LIKE %s OR email LIKE %s "
+            "ORDER BY last_name, first_name LIMIT %s",
+            (prefix, prefix, prefix, limit)
+        )
+    return cursor.fetchall()
+
+def search_copies(cursor, q, limit, branch_id=None):
+    words = search_words(q)
+    select = ("SELECT BC.copy_id, BC.isbn, BC.branch_id, BC.status, B.title, LB.name AS branch_name, {score} AS score "
+              "FROM Book_Copies BC JOIN Books B ON B.isbn = BC.isbn "
+              "LEFT JOIN Library_Branches LB ON LB.branch_id = BC.branch_id WHERE {where}")
+    branch_sql, branch_params = ('', [])
+    if branch_id is not None:
+        branch_sql, branch_params = (' AND BC.branch_id = %s', [branch_id])
+    if q.isdigit():
+        where, params = isbn_prefix_clause('BC.isbn', q)
+        sql = select.format(score='1', where=where + branch_sql) + " ORDER BY BC.isbn, BC.branch_id, BC.copy_id LIMIT %s"
+        cursor.execute(sql, (*params, *branch_params, limit))
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN and not backend.fulltext:
+        where, params = word_match_clause(['B.title'], words)
+        sql = select.format(score='1', where=where + branch_sql) + " ORDER BY B.title, BC.copy_id LIMIT %s"
+        cursor.execute(sql, (*params, *branch_params, limit))
+    elif words and min(len(w) for w in words) >= FULLTEXT_MIN_TOKEN:
+        ft = fulltext_query(words)
+        match = "MATCH(B.title) AGAINST(%s IN BOOLEAN MODE)"
+        sql = select.format(score=match, where=match + branch_sql) + " ORDER BY score DESC, BC.copy_id LIMIT %s"
+        cursor.execute(sql, (ft, ft, *branch_params, limit))
+    else:
+        sql = select.format(score='1', where='B.title LIKE %s' + branch_sql) + " ORDER BY B.title, BC.copy_id LIMIT %s"
+        cursor.execute(sql, (like_prefix(q), *branch_params, limit))
+    return cursor.fetchall()
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    types = [t for t in (request.args.get('type') or ','.join(SEARCH_TYPES)).split(',') if t]
+    unknown = [t for t in types if t not in SEARCH_TYPES]
+    if unknown:
+        return jsonify({'error': f"Unknown search type: {', '.join(unknown)}"}), 400
+    try:
+        limit = int(request.args.get('limit') or SEARCH_DEFAULT_LIMIT)
+        branch_id = request.args.get('branch_id')
+        branch_id = int(branch_id) if branch_id else None
+    except ValueError:
+        return jsonify({'error': 'limit and branch_id must be integers'}), 400
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    try:
+        result = {'query': q}
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            if 'books' in types:
+                result['books'] = search_books(cursor, q, limit)
+            if 'members' in types:
+                result['members'] = search_members(cursor, q, limit)
+            if 'copies' in types:
+                result['copies'] = search_copies(cursor, q, limit, branch_id)
+            cursor.close()
+        return jsonify(result)
+    except Exception as e:
+        return error_response(e)
+
+# ==================== EXPORT ====================
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+class _LineBuffer:
+    """csv.writer target that hands each formatted line straight back."""
+    def write(self, line):
+        return line
+
+def export_value(value):
+    if isinstance(value, (_datetime.date, _datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def export_rows(table, pk, columns, since, fmt):
+    """Yield the table in CSV or NDJSON chunks, one chunk per fetchmany batch.
+
+    The cursor is unbuffered, so rows are pulled from the server as the
+    client consumes them and memory stays at one batch.
+    """
+    col_sql = ', '.join(columns)
+    with get_connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        if since is None:
+            cursor.execute(f"SELECT {col_sql} FROM {table} ORDER BY {pk}")
+        else:
+            cursor.execute(f"SELECT {col_sql} FROM {table} WHERE {pk} > %s ORDER BY {pk}", (since,))
+        writer = csv.writer(_LineBuffer())
+        if fmt == 'csv':
+            yield writer.writerow(columns)
+        while True:
+            batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            if fmt == 'csv':
+                yield ''.join(writer.writerow(r) for r in batch)
+            else:
+                yield ''.join(app.json.dumps(dict(zip(columns, r))) + '\n' for r in batch)
+        cursor.close()
+
+@app.route('/api/export/<entity>', methods=['GET'])
+def export_table(entity):
+    meta = ENTITIES.get(entity)
+    if meta is None:
+        return jsonify({'error': f'Unknown table: {entity}'}), 404
+    fmt = request.args.get('format') or 'csv'
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    columns = [c for c in (request.args.get('columns') or '').split(',') if c] or meta['columns']
+    unknown = [c for c in columns if c not in meta['columns']]
+    if unknown:
+        return jsonify({'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+    since = request.args.get('since')
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return jsonify({'error': 'since must be an integer'}), 400
+    response = Response(
+        stream_with_context(export_rows(meta['table'], meta['pk'], columns, since, fmt)),
+        mimetype=EXPORT_FORMATS[fmt]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}.{fmt}'
+    return response
+
+# ==================== SEED / SAMPLE DATA ====================
+SEED_DEFAULT_COUNTS = {'publishers': 3, 'authors': 6, 'branches': 2, 'members': 6,
+                       'books': 8, 'copies': 12, 'loans': 8}
+SEED_ORDER = ('publishers', 'authors', 'branches', 'members', 'books', 'copies', 'loans')
+SEED_TABLES = ('Publishers', 'Authors', 'Library_Branches', 'Members', 'Books', 'Book_Authors',
+               'Book_Copies', 'Loans')
+SEED_BATCH_SIZE = 5000       # rows per multi-row INSERT / transaction
+SEED_HTTP_MAX_ROWS = 100000  # per entity; larger datasets go through a job (?async=1) or `flask seed`
+SEED_JOB_MAX_ROWS = 10000000
+SEED_FIRST_NAMES = ['Oliver', 'Emma', 'Liam', 'Ava', 'Noah', 'Sophia', 'Mason', 'Isabella']
+SEED_LAST_NAMES = ['Brown', 'Wilson', 'Taylor', 'Anderson', 'Thomas', 'Moore', 'Martin', 'Lee']
+SEED_GENRES = ['Fiction', 'Science', 'History', 'Mystery', 'Romance', 'Non-Fiction']
+
+def seed_counts(values, limit=None):
+    """Merge per-entity target counts over SEED_DEFAULT_COUNTS. Raises ValueError on bad input."""
+    counts = dict(SEED_DEFAULT_COUNTS)
+    for entity, value in (values or {}).items():
+        if entity not in counts:
+            raise ValueError(f'Unknown entity: {entity}')
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{entity} count must be an integer')
+        if value < 0:
+            raise ValueError(f'{entity} count must not be negative')
+        if limit is not None and value > limit:
+            raise ValueError(f'{entity} count must be at most {limit}')
+        counts[entity] = value
+    return counts
+
+def insert_generated(conn, entity, rows, log=True, progress=None):
+    """Insert generated rows in SEED_BATCH_SIZE transactions; returns their primary keys.
+    `progress(entity, rows_so_far)` is called after every full batch."""
+    meta = ENTITIES[entity]
+    cursor = conn.cursor()
+    ids = []
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == SEED_BATCH_SIZE:
+            ids.extend(insert_generated_batch(conn, cursor, meta, batch, log))
+            batch = []
+            if progress:
+                progress(entity, len(ids))
+    if batch:
+        ids.extend(insert_generated_batch(conn, cursor, meta, batch, log))
+    cursor.close()
+    return ids
+
+def insert_generated_batch(conn, cursor, meta, batch, log):
+    ids = insert_rows(cursor, meta['table'], meta['columns'], batch)
+    bump_versions(cursor, meta['table'])
+    conn.commit()
+    if log:
+        log_changes(conn, meta['table'], 'insert', ids)
+    return ids
+
+def existing_ids(conn, table, pk, where=''):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {pk} FROM {table} {where} ORDER BY {pk}")
+    ids = [r[0] for r in cursor.fetchall()]
+    cursor.close()
+    return ids
+
+def generate_data(conn, counts, seed, as_of=None, log=True, progress=None):
+    """Insert `counts` rows per entity; the same seed and as_of give the same dataset.
+
+    Rows reference the rows generated alongside them, or the existing ones when
+    a referenced entity has a count of 0. Copy statuses are decided before the
+    copies are written: every open loan holds its own copy, which is inserted
+    as 'On Loan', and 'Reserved' copies are never loaned. `progress(inserted=...)`
+    receives the rows inserted so far per entity as the batches commit.
+    """
+    rng = random.Random(seed)
+    today = as_of or _datetime.date.today()
+    # distinguishes this run's unique names and emails from other seeds
+    run = f'{rng.getrandbits(32):08x}'
+    ids = {}
+    inserted = dict.fromkeys(SEED_ORDER, 0)
+
+    def report(entity, count):
+        inserted[entity] = count
+        progress(inserted=inserted)
+
+    def pick(entity, table, pk, where='', what=None):
+        if entity not in ids:
+            ids[entity] = existing_ids(conn, table, pk, where)
+        if not ids[entity]:
+            raise ValueError(f'Cannot generate rows without {what or entity}')
+        return ids[entity]
+
+    def insert(entity, rows):
+        if counts[entity]:
+            ids[entity] = insert_generated(conn, entity, rows, log, report if progress else None)
+            if progress:
+                report(entity, len(ids[entity]))
+
+    insert('publishers', ({'publisher_id': None, 'name': f'Publisher {run}-{i}',
+                           'address': f'{rng.randint(1, 999)} Publisher Rd',
+                           'phone': f'555-{rng.randint(1000, 9999)}'}
+                          for i in range(counts['publishers'])))
+    insert('authors', ({'author_id': None, 'first_name': rng.choice(SEED_FIRST_NAMES),
+                        'last_name': rng.choice(SEED_LAST_NAMES)}
+                       for _ in range(counts['authors'])))
+    insert('branches', ({'branch_id': None, 'name': f'Branch {run}-{i}', 'location': 'Local'}
+                        for i in range(counts['branches'])))
+
+    def members():
+        for i in range(counts['members']):
+            fn, ln = rng.choice(SEED_FIRST_NAMES), rng.choice(SEED_LAST_NAMES)
+            yield {'member_id': None, 'first_name': fn, 'last_name': ln,
+                   'email': f'{fn.lower()}.{ln.lower()}.{run}.{i}@example.com',
+                   'address': f'{rng.randint(1, 999)} Seed St',
+                   'phone': f'555-{rng.randint(1000, 9999)}', 'date_registered': today}
+    insert('members', members())
+
+    if counts['books']:
+        publishers = pick('publishers', 'Publishers', 'publisher_id')
+        # ISBNs come from AUTO_INCREMENT, so there is nothing to probe for collisions
+        insert('books', ({'isbn': None, 'title': f'Book {run}-{i}', 'publisher_id': rng.choice(publishers),
+                          'publication_year': rng.randint(1990, 2024), 'genre': rng.choice(SEED_GENRES)}
+                         for i in range(counts['books'])))
+        authors = ids['authors'] if 'authors' in ids else existing_ids(conn, 'Authors', 'author_id')
+        if authors:
+            cursor = conn.cursor()
+            links = [(isbn, rng.choice(authors)) for isbn in ids['books']]
+            for i in range(0, len(links), SEED_BATCH_SIZE):
+                cursor.executemany("INSERT INTO Book_Authors (isbn, author_id) VALUES (%s, %s)",
+                                   links[i:i + SEED_BATCH_SIZE])
+                bump_versions(cursor, 'Book_Authors')
+                conn.commit()
+            cursor.close()
+
+    # plan the loans first so copy statuses can be written once, already final
+    n_loans = counts['loans']
+    returned = [rng.random() < 0.45 for _ in range(n_loans)]
+    if counts['copies']:
+        statuses = rng.choices(['Available', 'Reserved'], weights=[0.75, 0.25], k=counts['copies'])
+        loanable = [i for i, s in enumerate(statuses) if s == 'Available']
+    else:
+        loanable = pick('copies', 'Book_Copies', 'copy_id', "WHERE status='Available'", 'available copies') if n_loans else []
+    wanted = returned.count(False)
+    open_copies = rng.sample(loanable, min(wanted, len(loanable)))
+    # not enough free copies: the surplus open loans become loan history
+    surplus = wanted - len(open_copies)
+    for i in reversed(range(n_loans)):
+        if not surplus:
+            break
+        if not returned[i]:
+            returned[i] = True
+            surplus -= 1
+
+    if counts['copies']:
+        for i in open_copies:
+            statuses[i] = 'On Loan'
+        isbns = pick('books', 'Books', 'isbn')
+        branches = pick('branches', 'Library_Branches', 'branch_id')
+        insert('copies', ({'copy_id': None, 'isbn': rng.choice(isbns), 'branch_id': rng.choice(branches),
+                           'status': status} for status in statuses))
+        open_copies = [ids['copies'][i] for i in open_copies]
+        loanable = [ids['copies'][i] for i in loanable]
+
+    if n_loans:
+        if not loanable:
+            raise ValueError('Cannot generate loans without available copies')
+        member_ids = pick('members', 'Members', 'member_id')
+        open_iter = iter(open_copies)
+
+        def loans():
+            for was_returned in returned:
+                issue_dt = today - _datetime.timedelta(days=rng.randint(0, 60))
+                loan_length = rng.randint(7, 28)
+                due_dt = issue_dt + _datetime.timedelta(days=loan_length)
+                row = {'loan_id': None, 'member_id': rng.choice(member_ids), 'issue_date': issue_dt,
+                       'due_date': due_dt, 'return_date': None, 'fine_amount': None}
+                if was_returned:
+                    # history may sit on any loanable copy, open loans each hold their own
+                    row['copy_id'] = rng.choice(loanable)
+                    return_dt = issue_dt + _datetime.timedelta(days=rng.randint(1, loan_length + 12))
+                    row['return_date'] = return_dt
+                    if return_dt > due_dt:
+                        row['fine_amount'] = round((return_dt - due_dt).days * rng.uniform(0.5, 2.0), 2)
+                else:
+                    row['copy_id'] = next(open_iter)
+                yield row
+        insert('loans', loans())
+
+        if not counts['copies'] and open_copies:
+            # loans against pre-existing copies: flip those copies in one set-based pass
+            cursor = conn.cursor()
+            for i in range(0, len(open_copies), SEED_BATCH_SIZE):
+                chunk = open_copies[i:i + SEED_BATCH_SIZE]
+                placeholders = ','.join(['%s'] * len(chunk))
+                cursor.execute(f"UPDATE Book_Copies SET status='On Loan' WHERE copy_id IN ({placeholders})",
+                               tuple(chunk))
+                bump_versions(cursor, 'Book_Copies')
+                conn.commit()
+                if log:
+                    log_changes(conn, 'Book_Copies', 'update', chunk)
+            cursor.close()
+
+    if counts['copies'] or counts['loans']:
+        # one set-based recount is cheaper than maintaining the counts batch by batch
+        rebuild_availability(conn)
+    return {entity: counts[entity] for entity in SEED_ORDER}
+
+@app.route('/api/seed', methods=['POST'])
+def seed_data():
+    body = request.get_json(silent=True) or {}
+    as_job = wants_job()
+    try:
+        counts = seed_counts(body.get('counts'), SEED_JOB_MAX_ROWS if as_job else SEED_HTTP_MAX_ROWS)
+        seed = body.get('seed')
+        seed = int(seed) if seed is not None else random.randrange(2 ** 32)
+        as_of = _datetime.date.fromisoformat(body['as_of']) if body.get('as_of') else None
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if as_job:
+            job_id, refused = submit_job('seed', counts=counts, seed=seed, as_of=as_of and as_of.isoformat())
+            return refused or job_accepted(job_id, seed=seed)
+        with get_connection() as conn:
+            try:
+                inserted = generate_data(conn, counts, seed, as_of)
+            finally:
+                # batches commit as they go, so a failed run still changed the tables
+                tables_changed(*SEED_TABLES)
+        return jsonify({'message': 'Seed completed', 'seed': seed, 'inserted': inserted}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return error_response(e)
+
+@job_kind('seed')
+def seed_job(job, counts, seed, as_of):
+    as_of = _datetime.date.fromisoformat(as_of) if as_of else None
+    with get_connection() as conn:
+        try:
+            inserted = generate_data(conn, counts, seed, as_of, progress=job.progress)
+        finally:
+            tables_changed(*SEED_TABLES)
+    return {'message': 'Seed completed', 'seed': seed, 'inserted': inserted}
+
+@app.cli.command('seed')
+@click.option('--seed', type=int, default=None, help='Random seed; the same seed reproduces the same dataset.')
+@click.option('--as-of', default=None, help='Date loans and registrations are relative to (YYYY-MM-DD, default today).')
+@click.option('--count', 'count_args', multiple=True, metavar='ENTITY=N',
+              help=f"Target rows per entity, repeatable. Entities: {', '.join(SEED_ORDER)}.")
+def seed_command(seed, as_of, count_args):
+    """Generate sample data, e.g. `flask --app app seed --seed 42 --count books=1000000`."""
+    try:
+        if any('=' not in arg for arg in count_args):
+            raise ValueError('--count takes ENTITY=N')
+        counts = seed_counts(dict(arg.split('=', 1) for arg in count_args))
+        as_of = _datetime.date.fromisoformat(as_of) if as_of else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    started = time.monotonic()
+    # runs outside the server process, so the change logs are left alone;
+    # the snapshots dumped at exit carry the new rows instead
+    with get_connection() as conn:
+        try:
+            inserted = generate_data(conn, counts, seed, as_of, log=False)
+        finally:
+            tables_changed(*SEED_TABLES)
+    click.echo(json.dumps({'seed': seed, 'inserted': inserted,
+                           'seconds': round(time.monotonic() - started, 1)}))
+
+@app.route('/api/snapshots', methods=['GET'])
+def get_snapshots():
+    status = snapshots.status()
+    status['changelog'] = changelog.status()
+    return jsonify(status)
+
+@app.route('/api/snapshots', methods=['POST'])
+def write_snapshots():
+    """Rewrite every CSV snapshot now, as a job."""
+    try:
+        job_id, refused = submit_job('snapshots')
+        return refused or job_accepted(job_id)
+    except Exception as e:
+        return error_response(e)
+
+@job_kind('snapshots')
+def snapshots_job(job):
+    written, errors = [], {}
+    for table, filename in SNAPSHOT_FILES.items():
+        job.progress(written=written)
+        error = snapshots.dump(table)
+        if error:
+            errors[table] = error
+        else:
+            written.append(filename)
+    return {'written': written, 'errors': errors}
+
+# ==================== DASHBOARD / ANALYTICS ====================
+TREND_GRANULARITIES = ('day', 'week', 'month')
+TREND_DEFAULT_WEEKS = 6
+TREND_MAX_BUCKETS = 1000
+
+# SQL expressions mapping issue_date to the first day of its bucket (weeks start on Monday), per backend
+TREND_BUCKET_SQL = {
+    'mysql': {
+        'day': "issue_date",
+        'week': "DATE_SUB(issue_date, INTERVAL WEEKDAY(issue_date) DAY)",
+        'month': "DATE_SUB(issue_date, INTERVAL DAYOFMONTH(issue_date) - 1 DAY)"
+    },
+    'sqlite': {
+        'day': "issue_date",
+        'week': "date(issue_date, '-' || WEEKDAY(issue_date) || ' days')",
+        'month': "date(issue_date, 'start of month')"
+    }
+}
+
+def bucket_start(d, granularity):
+    if granularity == 'week':
+        return d - _datetime.timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    return d
+
+def next_bucket(d, granularity):
+    if granularity == 'week':
+        return d + _datetime.timedelta(weeks=1)
+    if granularity == 'month':
+        return (d.replace(day=28) + _datetime.timedelta(days=4)).replace(day=1)
+    return d + _datetime.timedelta(days=1)
+
+def trend_args():
+    """Read ?from=&to=&granularity= for the loans trend; defaults to the last 6 weeks by week.
+    Raises ValueError on bad input."""
+    granularity = request.args.get('granularity') or 'week'
+    if granularity not in TREND_GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(TREND_GRANULARITIES)}")
+    try:
+        to_arg = request.args.get('to')
+        from_arg = request.args.get('from')
+        end = _datetime.date.fromisoformat(to_arg) if to_arg else _datetime.date.today()
+        if from_arg:
+            start = _datetime.date.fromisoformat(from_arg)
+        else:
+            start = bucket_start(end, 'week') - _datetime.timedelta(weeks=TREND_DEFAULT_WEEKS - 1)
+    except ValueError:
+        raise ValueError('from and to must be dates in YYYY-MM-DD format')
+    if start > end:
+        raise ValueError('from must not be after to')
+    start = bucket_start(start, granularity)
+    days = (end - start).days + 1
+    approx_buckets = {'day': days, 'week': days // 7 + 1, 'month': days // 28 + 1}[granularity]
+    if approx_buckets > TREND_MAX_BUCKETS:
+        raise ValueError(f'Range too large for {granularity} granularity (max {TREND_MAX_BUCKETS} buckets)')
+    return start, end, granularity
+
+def trend_query(start, end, granularity):
+    """(sql, params) counting loans issued per bucket between start and end (inclusive),
+    grouped in SQL over idx_loans_issue_date."""
+    bucket = TREND_BUCKET_SQL[backend.name][granularity]
+    return (f"SELECT {bucket} AS bucket, COUNT(*) AS cnt FROM Loans "
+            "WHERE issue_date >= %s AND issue_date < %s GROUP BY bucket",
+            (start, end + _datetime.timedelta(days=1)))
+
+def trend_series(rows, start, end, granularity):
+    """trend_query rows -> (labels, counts) with a zero for every empty bucket."""
+    counts = {}
+    for r in rows:
+        b = r['bucket']
+        if isinstance(b, _datetime.datetime):
+            b = b.date()
+        elif isinstance(b, str):
+            b = _datetime.date.fromisoformat(b[:10])
+        counts[b] = r['cnt']
+    labels, values = [], []
+    d = start
+    while d <= end:
+        labels.append(d.strftime('%Y-%m-%d'))
+        values.append(counts.get(d, 0))
+        d = next_bucket(d, granularity)
+    return labels, values
+
+def dashboard_queries(start, end, granularity):
+    """name -> (sql, params) of the dashboard aggregates. They are independent of each other."""
+    return {
+        # Books: total and per-genre counts in one pass
+        'genres': ("SELECT genre, COUNT(*) AS cnt FROM Books GROUP BY genre", ()),
+        # Copies: one GROUP BY feeds both the counters and the status distribution
+        'statuses': ("SELECT status, COUNT(*) AS cnt FROM Book_Copies GROUP BY status", ()),
+        'members': ("SELECT COUNT(*) AS active_members FROM Members", ()),
+        # Loans trend, bucketed in SQL
+        'trend': trend_query(start, end, granularity)
+    }
+
+def dashboard_payload(results, start, end, granularity):
+    """Dashboard JSON from the dashboard_queries results (name -> list of dict rows)."""
+    genre_rows = results['genres']
+    total_books = sum(r['cnt'] for r in genre_rows)
+    status_dist = {row['status']: row['cnt'] for row in results['statuses']}
+    active_members = results['members'][0].get('active_members', 0)
+    trend_labels, trend_counts = trend_series(results['trend'], start, end, granularity)
+
+    # Top genres
+    top_genres = sorted(genre_rows, key=lambda r: r['cnt'], reverse=True)[:6]
+    genres = [r['genre'] or 'Unknown' for r in top_genres]
+    genre_counts = [r['cnt'] for r in top_genres]
+
+    return {
+        'counts': {
+            'total_books': total_books,
+            'available_copies': status_dist.get('Available', 0),
+            'books_on_loan': status_dist.get('On Loan', 0),
+            'reserved_copies': status_dist.get('Reserved', 0),
+            'active_members': active_members
+        },
+        'status_distribution': status_dist,
+        'loans_trend': {
+            'granularity': granularity,
+            'labels': trend_labels,
+            'counts': trend_counts
+        },
+        'top_genres': {
+            'labels': genres,
+            'counts': genre_counts
+        }
+    }
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    try:
+        trend_from, trend_to, granularity = trend_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # the resolved range is part of the tag: the default one moves with the date
+    etag, not_modified = check_etag(DASHBOARD_TABLES, trend_from, trend_to, granularity)
+    if not_modified:
+        return not_modified
+    # keyed by the tag too, so a write from another process is not served from this cache
+    cache_key = ('dashboard', trend_from, trend_to, granularity, etag)
+    payload = dashboard_cache.get(cache_key)
+    if payload is not None:
+        return tag_response(jsonify(payload), etag)
+    try:
+        generation = dashboard_cache.generation()
+        results = {}
+        with get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            for name, (sql, params) in dashboard_queries(trend_from, trend_to, granularity).items():
+                cursor.execute(sql, params)
+                results[name] = cursor.fetchall()
+            cursor.close()
+        payload = dashboard_payload(results, trend_from, trend_to, granularity)
+        dashboard_cache.set(cache_key, payload, generation)
+        return tag_response(jsonify(payload), etag)
+    except Exception as e:
+        return error_response(e)
+
+if __name__ == '__main__':
+    if storage_config['migrate_on_startup']:
+        with get_connection() as conn:
+            migrate(conn)
     app.run(debug=True, port=5000)
\ No newline at end of file
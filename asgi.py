@@ -0,0 +1,360 @@
+"""ASGI entry point: the API of app.py served from an event loop.
+
+    pip install aiomysql uvicorn
+    uvicorn asgi:application --port 5000
+
+The hot read routes (the list endpoints and the dashboard) run as coroutines on an
+aiomysql pool: a request waiting on MySQL holds a pooled connection but no thread,
+so one process keeps many more requests in flight than its thread pool could, and
+the dashboard's aggregates run concurrently on separate connections. Every other
+route is the Flask view itself, run on a bounded thread pool through a small WSGI
+bridge, so paths, JSON shapes, status codes and headers are the same either way.
+
+SQLite has no async driver; with LIBRARY_STORAGE=sqlite the native routes run their
+statements on the app's own pool from the same threads.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+import app as library
+
+# aiomysql pool. Waiting coroutines are cheap, so it may be far larger than the threaded pool:
+#   minsize / maxsize - connections kept open / opened at most
+#   timeout           - seconds to wait for a free connection before giving up
+#   recycle           - connections older than this many seconds are reopened
+async_pool_config = {
+    'minsize': library.pool_config['pool_size'],
+    'maxsize': int(os.environ.get('LIBRARY_ASYNC_POOL_SIZE', 100)),
+    'timeout': library.pool_config['timeout'],
+    'recycle': library.pool_config['recycle']
+}
+
+# threads for the routes served by Flask itself; as many as the threaded pool hands out connections
+WSGI_THREADS = library.pool_config['pool_size'] + library.pool_config['max_overflow']
+WSGI_QUEUE_CHUNKS = 8   # response chunks buffered between a WSGI thread and the event loop
+
+
+# ==================== DATABASES ====================
+class AsyncMySQLDatabase:
+    """Statements on an aiomysql pool, one pooled connection per statement."""
+
+    def __init__(self, db_config, config):
+        self.db_config = db_config
+        self.config = config
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        if aiomysql is None:
+            raise RuntimeError('Serving MySQL over ASGI needs aiomysql: pip install aiomysql')
+        async with self._lock:
+            if self._pool is None:
+                self._pool = await aiomysql.create_pool(
+                    host=self.db_config['host'], user=self.db_config['user'],
+                    password=self.db_config['password'], db=self.db_config['database'],
+                    charset='utf8mb4', autocommit=True,
+                    minsize=self.config['minsize'], maxsize=self.config['maxsize'],
+                    pool_recycle=self.config['recycle']
+                )
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def fetch(self, sql, params=()):
+        """(columns, rows) of one statement."""
+        if self._pool is None:
+            await self.open()
+        timeout = self.config['timeout']
+        stats = library.request_stats.get()
+        started = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise library.PoolTimeout(f'No database connection available after {timeout}s')
+        if stats is not None:
+            library.metrics.pool_wait.observe(time.perf_counter() - started)
+            stats.statements += 1
+        try:
+            async with conn.cursor() as cursor:
+                executed = time.perf_counter()
+                await cursor.execute(sql, params)
+                rows = await cursor.fetchall()
+                if stats is not None:
+                    stats.rows += len(rows)
+                    if stats.profile is not None:
+                        entry = library.QueryEntry(sql, params, False, executed - stats.started)
+                        entry.seconds, entry.rows = time.perf_counter() - executed, len(rows)
+                        stats.profile.record(entry, None, stats)
+                return [d[0] for d in cursor.description], list(rows)
+        finally:
+            self._pool.release(conn)
+
+
+class ThreadedDatabase:
+    """Statements on the app's connection pool, run from worker threads."""
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def fetch(self, sql, params=()):
+        # in a copy of this request's context, so its statements are metered like the Flask routes'
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, self._fetch, sql, params)
+
+    def _fetch(self, sql, params):
+        with library.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            columns = [d[0] for d in cursor.description]
+            cursor.close()
+        return columns, rows
+
+
+# ==================== NATIVE ROUTES ====================
+# Coroutine versions of Flask views, called inside the request's Flask request context so the
+# argument parsing, ETag and response helpers of app.py apply unchanged.
+async def check_etag(db, tables, *parts):
+    """library.check_etag with the table versions read through `db` instead of a blocking query
+    when the in-process copy has expired."""
+    versions = library.table_versions.cached(tables)
+    if versions is None:
+        generation = library.table_versions.generation()
+        try:
+            _, rows = await db.fetch(*library.table_versions.query())
+            versions = dict(rows)
+            library.table_versions.store(versions, generation)
+        except Exception:
+            versions = None   # check_etag retries the read itself and answers untagged if that fails too
+    return library.check_etag(tables, *parts, versions=versions)
+
+def list_route(entity, table, pk):
+    async def get_list(db):
+        try:
+            after, limit = library.page_args()
+            fields, filters = library.list_args(entity)
+        except ValueError as e:
+            return library.jsonify({'error': str(e)}), 400
+        etag, not_modified = await check_etag(db, [table])
+        if not_modified:
+            return not_modified
+        try:
+            columns, rows = await db.fetch(*library.page_query(table, pk, after, limit, fields, filters))
+            return library.page_response(*library.split_page(columns, rows, pk, limit, fields), etag)
+        except Exception as e:
+            return library.error_response(e)
+    return get_list
+
+async def get_dashboard(db):
+    try:
+        trend_from, trend_to, granularity = library.trend_args()
+    except ValueError as e:
+        return library.jsonify({'error': str(e)}), 400
+    etag, not_modified = await check_etag(db, library.DASHBOARD_TABLES, trend_from, trend_to, granularity)
+    if not_modified:
+        return not_modified
+    cache_key = ('dashboard', trend_from, trend_to, granularity, etag)
+    payload = library.dashboard_cache.get(cache_key)
+    if payload is not None:
+        return library.tag_response(library.jsonify(payload), etag)
+    try:
+        generation = library.dashboard_cache.generation()
+        queries = library.dashboard_queries(trend_from, trend_to, granularity)
+        # independent aggregates, each on its own connection, all in flight at once
+        fetched = await asyncio.gather(*(db.fetch(sql, params) for sql, params in queries.values()))
+        results = {name: [dict(zip(columns, row)) for row in rows]
+                   for name, (columns, rows) in zip(queries, fetched)}
+        payload = library.dashboard_payload(results, trend_from, trend_to, granularity)
+        library.dashboard_cache.set(cache_key, payload, generation)
+        return library.tag_response(library.jsonify(payload), etag)
+    except Exception as e:
+        return library.error_response(e)
+
+NATIVE_ROUTES = {f'/api/{entity}': list_route(entity, meta['table'], meta['pk'])
+                 for entity, meta in library.ENTITIES.items()}
+NATIVE_ROUTES['/api/dashboard'] = get_dashboard
+
+
+# ==================== ASGI APPLICATION ====================
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI http scope."""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    if body:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ[name] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def encode_headers(headers):
+    return [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+
+class LibraryASGI:
+    def __init__(self, flask_app, executor, database):
+        self.flask_app = flask_app
+        self.executor = executor
+        self.database = database
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = wsgi_environ(scope, body)
+        handler = NATIVE_ROUTES.get(environ['PATH_INFO']) if scope['method'] == 'GET' else None
+        if handler is not None:
+            await self.native(handler, environ, send)
+        else:
+            await self.wsgi(environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if library.storage_config['migrate_on_startup']:
+                        await asyncio.get_running_loop().run_in_executor(self.executor, migrate)
+                    await self.database.open()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.database.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def native(self, handler, environ, send):
+        with self.flask_app.request_context(environ):
+            rv = self.flask_app.preprocess_request()
+            if rv is None:
+                rv = await handler(self.database)
+            response = self.flask_app.process_response(self.flask_app.make_response(rv))
+            status, headers, body = response.status_code, response.headers.items(), response.get_data()
+        await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def wsgi(self, environ, send):
+        """Run the Flask app for one request on a worker thread and relay its response chunks.
+        The whole request, streamed bodies included, stays on that one thread."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(WSGI_QUEUE_CHUNKS)
+        started = {}
+        abandoned = False
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def run():
+            try:
+                result = self.flask_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if abandoned:
+                            break
+                        put(chunk)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        worker = loop.run_in_executor(self.executor, run)
+        sent_start = False
+        try:
+            while True:
+                item = await chunks.get()
+                if isinstance(item, BaseException):
+                    raise item
+                if not sent_start:
+                    await send({'type': 'http.response.start', 'status': started['status'],
+                                'headers': encode_headers(started['headers'])})
+                    sent_start = True
+                if item is None:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    break
+                if item:
+                    await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+        finally:
+            # the client may be gone: let the worker finish instead of blocking on a full queue
+            abandoned = True
+            while not worker.done():
+                try:
+                    await asyncio.wait_for(chunks.get(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+            await worker
+
+
+def migrate():
+    with library.get_connection() as conn:
+        library.migrate(conn)
+
+def make_database(executor):
+    if library.backend.name == 'mysql':
+        return AsyncMySQLDatabase(library.db_config, async_pool_config)
+    return ThreadedDatabase(executor)
+
+
+executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+application = LibraryASGI(library.app, executor, make_database(executor))
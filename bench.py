@@ -0,0 +1,424 @@
+"""Endpoint benchmark and load test for app.py.
+
+Builds a throwaway database from DB_Project.sql, fills it with the seed
+generator at the requested scale and drives the routes from a pool of
+threads through Flask's test client. Nothing leaves the machine: the
+database is either the local MySQL server the app is configured for or,
+with --storage sqlite, an embedded SQLite file in a temporary directory.
+
+    python bench.py --scale 1 --concurrency 1,8,32 --requests 500 -o bench-$(git rev-parse --short HEAD).json
+
+Every run writes one JSON document (see README, "Benchmarks") so results
+from different commits can be diffed side by side.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# rows per entity at --scale 1
+BASE_COUNTS = {'publishers': 50, 'authors': 500, 'branches': 10, 'members': 5000,
+               'books': 10000, 'copies': 30000, 'loans': 50000}
+
+# ISBNs set aside above the generated books for rows the write scenarios create with explicit keys
+BENCH_ISBN_BLOCK = 1000000
+
+# copies set aside for the loan scenarios; checkout lends CHECKOUT_BATCH of them per request
+CHECKOUT_HOT_COPIES = 50
+CHECKOUT_BATCH = 5
+
+
+# ==================== SCHEMA ====================
+def create_database(app, database):
+    """Recreate `database` from DB_Project.sql and point the app's pool at it."""
+    import mysql.connector
+    config = {k: v for k, v in app.db_config.items() if k != 'database'}
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    for statement in app.schema_statements():
+        cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    app.pool.dispose()
+    app.db_config['database'] = database
+
+
+# ==================== QUERY COUNTING ====================
+class _QueryCounter(threading.local):
+    count = 0
+
+queries = _QueryCounter()
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        queries.count += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        queries.count += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def count_queries(app):
+    """Wrap pooled connections so statements are counted per request (per thread)."""
+    acquire, release = app.pool.acquire, app.pool.release
+    app.pool.acquire = lambda: CountingConnection(acquire())
+    app.pool.release = lambda conn: release(conn._conn)
+
+
+# ==================== MEASUREMENT ====================
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples, wall):
+    """samples: list of (seconds, queries, failed) tuples."""
+    latencies = sorted(s[0] * 1000 for s in samples)
+    n = len(samples)
+    return {
+        'requests': n,
+        'errors': sum(1 for s in samples if s[2]),
+        'rps': round(n / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3) if n else None,
+            'p95': round(percentile(latencies, 95), 3) if n else None,
+            'p99': round(percentile(latencies, 99), 3) if n else None,
+            'mean': round(sum(latencies) / n, 3) if n else None,
+            'max': round(latencies[-1], 3) if n else None
+        },
+        'queries_per_request': round(sum(s[1] for s in samples) / n, 2) if n else None
+    }
+
+
+class Recorder:
+    """Collects (seconds, queries, failed) per step of a scenario."""
+
+    def __init__(self):
+        self.samples = {}
+        self.enabled = True
+        self._lock = threading.Lock()
+
+    def call(self, client, step, method, url, **kwargs):
+        queries.count = 0
+        start = time.perf_counter()
+        resp = client.open(url, method=method, **kwargs)
+        resp.get_data()  # drain streamed bodies inside the timing
+        elapsed = time.perf_counter() - start
+        resp.close()
+        if self.enabled:
+            with self._lock:
+                self.samples.setdefault(step, []).append((elapsed, queries.count, resp.status_code >= 400))
+        return resp
+
+
+# ==================== SCENARIOS ====================
+class Dataset:
+    """Key ranges of the generated data, for picking realistic request parameters."""
+
+    def __init__(self, app):
+        self.ids = {}
+        with app.get_connection() as conn:
+            cursor = conn.cursor()
+            for entity, meta in app.ENTITIES.items():
+                cursor.execute(f"SELECT MIN({meta['pk']}), MAX({meta['pk']}), COUNT(*) FROM {meta['table']}")
+                self.ids[entity] = cursor.fetchone()
+            # the generated loans keep most copies out, so the loan scenarios get copies of their own
+            cursor.executemany("INSERT INTO Book_Copies (isbn, branch_id, status) VALUES (%s, %s, 'Available')",
+                               [(self.ids['books'][0], self.ids['branches'][0])] * CHECKOUT_HOT_COPIES)
+            self.lendable_copies = list(range(cursor.lastrowid, cursor.lastrowid + CHECKOUT_HOT_COPIES))
+            app.refresh_availability(cursor, [(self.ids['books'][0], self.ids['branches'][0])])
+            # push AUTO_INCREMENT past the block, so rows the app numbers itself never collide with it
+            reserved = (self.ids['books'][1] or 0) + BENCH_ISBN_BLOCK
+            cursor.execute("INSERT INTO Books (isbn, title) VALUES (%s, 'bench reservation')", (reserved,))
+            cursor.execute("DELETE FROM Books WHERE isbn = %s", (reserved,))
+            conn.commit()
+            cursor.close()
+        self._isbns = itertools.count(reserved - BENCH_ISBN_BLOCK + 1)
+
+    def random_id(self, rng, entity):
+        low, high, _ = self.ids[entity]
+        return rng.randint(low or 0, high or 0)
+
+    def new_isbn(self):
+        return next(self._isbns)
+
+    def counts(self):
+        return {entity: ids[2] for entity, ids in self.ids.items()}
+
+
+def book_row(isbn, rng):
+    return {'isbn': isbn, 'title': f'Bench book {isbn}', 'genre': rng.choice(['Fiction', 'Science', 'History']),
+            'publisher_id': None, 'publication_year': rng.randint(1990, 2024)}
+
+def list_scenario(entity):
+    def run(rec, client, data, rng):
+        rec.call(client, 'list', 'GET', f'/api/{entity}?limit=100&after={data.random_id(rng, entity)}')
+    return run
+
+def home(rec, client, data, rng):
+    rec.call(client, 'home', 'GET', '/')
+
+def search(rec, client, data, rng):
+    q = rng.choice(['Emma', 'Brown', 'Book', 'Lee', str(data.random_id(rng, 'books'))[:4]])
+    rec.call(client, 'search', 'GET', f'/api/search?q={q}')
+
+def export(rec, client, data, rng):
+    since = max(0, data.ids['loans'][1] - 1000)
+    rec.call(client, 'export', 'GET', f'/api/export/loans?format=ndjson&since={since}')
+
+def dashboard(rec, client, data, rng):
+    rec.call(client, 'dashboard', 'GET', '/api/dashboard')
+
+def dashboard_uncached(rec, client, data, rng, app=None):
+    app.dashboard_cache.invalidate()
+    rec.call(client, 'dashboard', 'GET', '/api/dashboard')
+
+def overdue(rec, client, data, rng):
+    rec.call(client, 'overdue', 'GET', f"/api/loans/overdue?limit=100&after={data.random_id(rng, 'members')}")
+
+def fines(rec, client, data, rng):
+    # a different day each time, so every run has fines to move
+    as_of = date.today() + timedelta(days=rng.randint(0, 60))
+    rec.call(client, 'fines', 'POST', '/api/fines/assess', json={'as_of': as_of.isoformat()})
+
+def snapshots(rec, client, data, rng):
+    rec.call(client, 'snapshots', 'GET', '/api/snapshots')
+
+def crud_books(rec, client, data, rng):
+    isbn = data.new_isbn()
+    row = book_row(isbn, rng)
+    row['publisher_id'] = data.random_id(rng, 'publishers')
+    rec.call(client, 'create', 'POST', '/api/books', json=row)
+    row['title'] += ' (2nd ed.)'
+    rec.call(client, 'update', 'PUT', f'/api/books/{isbn}', json=row)
+    rec.call(client, 'delete', 'DELETE', f'/api/books/{isbn}')
+
+def crud_loans(rec, client, data, rng):
+    today = date.today()
+    resp = rec.call(client, 'create', 'POST', '/api/loans', json={
+        'copy_id': rng.choice(data.lendable_copies), 'member_id': data.random_id(rng, 'members'),
+        'issue_date': today.isoformat(), 'due_date': (today + timedelta(days=14)).isoformat()})
+    loan_id = (resp.get_json(silent=True) or {}).get('loan_id')
+    if loan_id:
+        rec.call(client, 'delete', 'DELETE', f'/api/loans/{loan_id}')
+
+def checkout(rec, client, data, rng):
+    # every worker draws from the same few copies, so batches collide on the row locks
+    copies = rng.sample(data.lendable_copies, CHECKOUT_BATCH)
+    resp = rec.call(client, 'checkout', 'POST', '/api/loans/checkout', json={'items': [
+        {'copy_id': copy_id, 'member_id': data.random_id(rng, 'members')} for copy_id in copies]})
+    loans = [loan['loan_id'] for loan in (resp.get_json(silent=True) or {}).get('loans', [])]
+    if loans:
+        # hand the copies back so the hot set stays lendable
+        rec.call(client, 'return', 'POST', '/api/loans/bulk_delete', json={'ids': loans})
+
+def bulk_delete(rec, client, data, rng):
+    isbns = [data.new_isbn() for _ in range(10)]
+    rows = [book_row(isbn, rng) for isbn in isbns]
+    rec.call(client, 'import', 'POST', '/api/books/bulk', json=rows)
+    rec.call(client, 'bulk_delete', 'POST', '/api/books/bulk_delete', json={'ids': isbns})
+
+def bulk_import(rec, client, data, rng):
+    rows = [book_row(data.new_isbn(), rng) for _ in range(100)]
+    rec.call(client, 'import', 'POST', '/api/books/bulk', json=rows)
+
+def seed(rec, client, data, rng):
+    rec.call(client, 'seed', 'POST', '/api/seed', json={'seed': rng.randrange(2 ** 32)})
+
+
+def scenarios(app):
+    found = {'home': home}
+    for entity in app.ENTITIES:
+        found[f'list_{entity}'] = list_scenario(entity)
+    found.update({
+        'search': search,
+        'export': export,
+        'dashboard': dashboard,
+        'dashboard_uncached': lambda *a: dashboard_uncached(*a, app=app),
+        'snapshots': snapshots,
+        'overdue': overdue,
+        'fines': fines,
+        'crud_books': crud_books,
+        'crud_loans': crud_loans,
+        'checkout': checkout,
+        'bulk_delete': bulk_delete,
+        'bulk_import': bulk_import,
+        'seed': seed
+    })
+    return found
+
+
+# ==================== DRIVER ====================
+def run_scenario(app, data, scenario, iterations, concurrency, warmup, seed_value):
+    """Run `iterations` of one scenario spread over `concurrency` threads."""
+    rec = Recorder()
+    next_iteration = itertools.count()
+
+    def worker(worker_id):
+        client = app.app.test_client()
+        rng = random.Random(f'{seed_value}-{concurrency}-{worker_id}')
+        while next(next_iteration) < iterations:
+            scenario(rec, client, data, rng)
+
+    rec.enabled = False
+    for i in range(warmup):
+        scenario(rec, app.app.test_client(), data, random.Random(f'{seed_value}-{concurrency}-warmup-{i}'))
+    rec.enabled = True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    result = summarize([s for samples in rec.samples.values() for s in samples], wall)
+    result['iterations'] = iterations
+    result['wall_seconds'] = round(wall, 3)
+    if len(rec.samples) > 1:
+        result['steps'] = {step: summarize(samples, wall) for step, samples in rec.samples.items()}
+    return result
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the library API against a throwaway local database.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplier for the generated dataset (1 = %s)' % ', '.join(
+                            f'{n} {e}' for e, n in BASE_COUNTS.items()))
+    parser.add_argument('--seed', type=int, default=1, help='seed for the dataset and the request mix')
+    parser.add_argument('--concurrency', default='1,8', help='comma-separated thread counts to run at')
+    parser.add_argument('--requests', type=int, default=200, help='iterations per scenario and concurrency level')
+    parser.add_argument('--warmup', type=int, default=5, help='unrecorded iterations before each run')
+    parser.add_argument('--scenarios', default='', help='comma-separated subset of scenarios (default all)')
+    parser.add_argument('--list', action='store_true', help='list the scenarios and exit')
+    parser.add_argument('--storage', choices=['mysql', 'sqlite'], default='mysql',
+                        help='storage backend to benchmark (sqlite uses a fresh file per run)')
+    parser.add_argument('--database', default='library_bench', help='MySQL database to (re)create for the run')
+    parser.add_argument('--host', help='database host (default: app.db_config)')
+    parser.add_argument('--user', help='database user (default: app.db_config)')
+    parser.add_argument('--password', help='database password (default: app.db_config)')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # keep snapshots, change logs and the SQLite file of the throwaway database out of data/
+    workdir = tempfile.mkdtemp(prefix='library-bench-')
+    os.environ['LIBRARY_DATA_DIR'] = workdir
+    os.environ['LIBRARY_STORAGE'] = args.storage
+    os.environ['LIBRARY_SQLITE_PATH'] = os.path.join(workdir, 'bench.sqlite3')
+    sys.path.insert(0, ROOT)
+    import app
+
+    available = scenarios(app)
+    if args.list:
+        print('\n'.join(available))
+        return 0
+    selected = [s for s in args.scenarios.split(',') if s] or list(available)
+    unknown = [s for s in selected if s not in available]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        levels = [int(c) for c in args.concurrency.split(',') if c]
+    except ValueError:
+        print('--concurrency takes comma-separated integers', file=sys.stderr)
+        return 2
+
+    for key in ('host', 'user', 'password'):
+        if getattr(args, key) is not None:
+            app.db_config[key] = getattr(args, key)
+    # one connection per thread plus the snapshot writer, so pool waits do not skew latencies
+    app.pool = app.ConnectionPool(app.backend, **{**app.pool_config, 'pool_size': max(levels) + 2})
+
+    if app.backend.name == 'mysql':
+        create_database(app, args.database)
+    with app.get_connection() as conn:
+        app.migrate(conn)
+    counts = {entity: int(n * args.scale) for entity, n in BASE_COUNTS.items()}
+    started = time.perf_counter()
+    with app.get_connection() as conn:
+        app.generate_data(conn, counts, args.seed, log=False)
+    seed_seconds = time.perf_counter() - started
+    count_queries(app)
+    data = Dataset(app)
+
+    results = []
+    for concurrency in levels:
+        for name in selected:
+            result = run_scenario(app, data, available[name], args.requests, concurrency, args.warmup, args.seed)
+            results.append({'scenario': name, 'concurrency': concurrency, **result})
+            print(f"{name:<20} c={concurrency:<3} {result['rps']:>9} req/s  "
+                  f"p50 {result['latency_ms']['p50']} ms  p99 {result['latency_ms']['p99']} ms  "
+                  f"{result['queries_per_request']} q/req  {result['errors']} errors", file=sys.stderr)
+
+    report = {
+        'meta': {
+            **git_revision(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'dataset': data.counts(),
+            'seed_seconds': round(seed_seconds, 3)
+        },
+        'results': results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())